@@ -5,21 +5,28 @@ from django.utils.html import format_html
 from . import models
 
 
-@admin.register(models.SocialAccount)
-class SocialAccountAdmin(admin.ModelAdmin):
+@admin.register(models.SocialIdentity)
+class SocialIdentityAdmin(admin.ModelAdmin):
     list_display = (
         'user',
+        'provider',
+        'uid',
+    )
+    list_filter = (
+        'provider',
     )
     readonly_fields = (
         'user_',
-        'facebook_id',
-        'google_id',
+        'provider',
+        'uid',
+        'created',
     )
     exclude = (
         'user',
     )
     search_fields = (
         'user__username',
+        'uid',
     )
 
     def user_(self, instance):
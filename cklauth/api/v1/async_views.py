@@ -0,0 +1,221 @@
+"""
+Async versions of the authentication views, for ASGI deployments on Django 3.1+.
+
+Provider calls are made with `httpx` and passwords are hashed in an executor without blocking the
+event loop, and the database work runs through `sync_to_async`, so one ASGI worker can keep many
+logins in flight. The views take the same requests and return the same responses as their sync
+counterparts.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from cklauth import conf, hashing, metrics, providers, ratelimit, tokens
+from .serializers import PasswordResetSerializer, RegisterSerializerFactory
+from .views import (
+    AuthError, FacebookAuthView, GoogleAuthView, LoginView, RegisterView, auth_response,
+    error_response, send_password_reset
+)
+
+
+class AsyncAuthView(object):
+    # Whether `perform_action` hashes a password and must go through admission control
+    hashes_password = False
+
+    @classmethod
+    def as_view(cls):
+        # Class-based async views need Django 4.1, so this returns a plain coroutine function
+        async def view(request, *args, **kwargs):
+            if request.method != 'POST':
+                return HttpResponseNotAllowed(['POST'])
+            return await cls().post(request)
+
+        view.view_class = cls
+        # Same as the DRF views, these endpoints don't rely on cookies
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request):
+        request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+
+        try:
+            return await self.handle(request)
+        except (AuthError, hashing.HashingQueueFull) as error:
+            return error_response(error)
+        except exceptions.ValidationError as error:
+            return JsonResponse(error.detail, status=error.status_code, safe=False)
+        except exceptions.APIException as error:
+            response = JsonResponse({'detail': error.detail}, status=error.status_code)
+            if getattr(error, 'wait', None):
+                response['Retry-After'] = '%d' % math.ceil(error.wait)
+            return response
+
+    async def handle(self, request):
+        if self.hashes_password:
+            with hashing.admission.admit():
+                user, token, status_code = await self.perform_action(request)
+        else:
+            user, token, status_code = await self.perform_action(request)
+        return await sync_to_async(auth_response)(user, token, status_code)
+
+    async def perform_action(self, request):
+        """
+        Returns:
+            (tuple) The user, its token and the response status code.
+        """
+        raise NotImplementedError('The view should implement `perform_action` method')
+
+
+class AsyncRegisterView(AsyncAuthView):
+    hashes_password = True
+
+    async def perform_action(self, request):
+        view = RegisterView()
+        RegisterSerializer = RegisterSerializerFactory(conf.auth_settings().user_serializer)
+
+        serializer = RegisterSerializer(
+            data=request.data,
+            context={'device': view.get_device(request)}
+        )
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        encoded_password = await hashing.amake_password(serializer.validated_data['password'])
+        user, token = await sync_to_async(serializer.save)(encoded_password=encoded_password)
+        return user, token, view.status_code
+
+
+class AsyncLoginView(AsyncAuthView):
+    hashes_password = True
+
+    async def perform_action(self, request):
+        view = LoginView()
+        validated_data = conf.auth_settings().login_validator.validate(request.data)
+        login_field = validated_data[settings.CKL_REST_AUTH['LOGIN_FIELD']]
+        password = validated_data['password']
+        await sync_to_async(ratelimit.check, thread_sensitive=False)(request, 'login', login_field)
+
+        # Goes through `AUTHENTICATION_BACKENDS` like the sync view. Not thread sensitive, so
+        # concurrent logins hash in parallel instead of queueing on a single thread (the cklauth
+        # backend hashes in the hashing executor when it is enabled)
+        user = await sync_to_async(authenticate, thread_sensitive=False)(
+            username=login_field,
+            password=password
+        )
+
+        if not user:
+            raise AuthError(message='Wrong credentials.', status=status.HTTP_401_UNAUTHORIZED)
+
+        token = await sync_to_async(tokens.issue_token)(user, device=view.get_device(request))
+        return user, token, view.status_code
+
+
+class AsyncPasswordResetView(AsyncAuthView):
+    async def handle(self, request):
+        serializer = PasswordResetSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(ratelimit.check, thread_sensitive=False)(
+            request,
+            'password_reset',
+            serializer.validated_data['email']
+        )
+
+        await sync_to_async(send_password_reset)(request, serializer.validated_data)
+
+        return JsonResponse(request.data, status=status.HTTP_200_OK)
+
+
+class AsyncSocialAuthView(AsyncAuthView):
+    """
+    Runs the `SocialAuthView` subclass `view_class`, awaiting its provider calls.
+    """
+    view_class = None
+
+    async def perform_action(self, request):
+        view = self.view_class()
+        user_info = await self.fetch_user_info(view, request)
+        user, token = await sync_to_async(view.login_social_user)(request, user_info)
+        return user, token, view.status_code
+
+    async def call_provider(self, view, endpoint, method, url, **kwargs):
+        try:
+            return await providers.async_client.request(
+                '{}.{}'.format(view.platform.lower(), endpoint),
+                method,
+                url,
+                **kwargs
+            )
+        except providers.ASYNC_HTTP_ERRORS + (providers.CircuitOpen, ) as error:
+            raise view.provider_error(error)
+
+    async def get_token_data(self, view, request):
+        token_data = view.get_client_token_data(request)
+        if token_data is not None:
+            return token_data
+
+        response = await self.call_provider(
+            view,
+            'token',
+            'post',
+            view.token_url,
+            data=view.get_token_payload(request)
+        )
+
+        view.validate_response(response)
+
+        return response.json()
+
+    async def get_user_info(self, view, access_token, expires_in=None):
+        cache_key, timeout = view.user_info_cache(access_token, expires_in)
+        if timeout:
+            user_info = await sync_to_async(cache.get, thread_sensitive=False)(cache_key)
+            if user_info is not None:
+                metrics.incr('providers.{}.user_info.cache_hits'.format(view.platform.lower()))
+                return user_info
+
+        url, kwargs = view.get_user_info_request(access_token)
+        response = await self.call_provider(view, 'user_info', 'get', url, **kwargs)
+        user_info = view.parse_user_info(response)
+
+        if timeout:
+            await sync_to_async(cache.set, thread_sensitive=False)(cache_key, user_info, timeout)
+        return user_info
+
+    async def fetch_user_info(self, view, request):
+        token_data = await self.get_token_data(view, request)
+        return await self.get_user_info(
+            view,
+            token_data['access_token'],
+            token_data.get('expires_in')
+        )
+
+
+class AsyncGoogleAuthView(AsyncSocialAuthView):
+    view_class = GoogleAuthView
+
+    async def fetch_user_info(self, view, request):
+        if not view.VERIFY_ID_TOKEN:
+            return await super().fetch_user_info(view, request)
+
+        token_data = await self.get_token_data(view, request)
+        if not token_data.get('id_token'):
+            return await self.get_user_info(
+                view,
+                token_data['access_token'],
+                token_data.get('expires_in')
+            )
+
+        # Only fetches Google's keys when they aren't cached, outside of the event loop
+        return await sync_to_async(view.get_id_token_user_info, thread_sensitive=False)(
+            token_data['id_token']
+        )
+
+
+class AsyncFacebookAuthView(AsyncSocialAuthView):
+    view_class = FacebookAuthView
@@ -1,14 +1,70 @@
+import copy
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from operator import attrgetter
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
 from rest_framework.validators import UniqueValidator
-from rest_framework.authtoken.models import Token
+
+from cklauth import hashing, tokens
+from cklauth.models import DeviceToken
 
 
 User = get_user_model()
 
 
-class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+UNCOMPILABLE_FIELDS = (
+    serializers.BaseSerializer,
+    serializers.HiddenField,
+    serializers.ManyRelatedField,
+    serializers.RelatedField,
+    serializers.SerializerMethodField,
+)
+
+_field_maps = weakref.WeakKeyDictionary()
+_field_subsets = weakref.WeakKeyDictionary()
+
+
+def copy_fields(fields):
+    """
+    Deep copy a field map, with copies of the validators too since DRF shares them between
+    copies and some, like `UniqueValidator`, keep per-call state.
+    """
+    copied = OrderedDict()
+    for name, field in fields.items():
+        copied[name] = copy.deepcopy(field)
+        copied[name].validators = [copy.copy(validator) for validator in field.validators]
+    return copied
+
+
+class CachedFieldsMixin(object):
+    """
+    Builds the fields of a model serializer class once, instead of introspecting the model every
+    time the serializer is instantiated. Each instance gets its own copy.
+    """
+
+    def get_fields(self):
+        return copy_fields(self.get_field_templates())
+
+    def get_field_templates(self):
+        """
+        Returns the cached fields of the class, that instances copy.
+        """
+        fields = _field_maps.get(type(self))
+        if fields is None:
+            fields = _field_maps.setdefault(type(self), super().get_fields())
+        return fields
+
+
+class DynamicFieldsModelSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     A ModelSerializer that takes an additional `fields` argument that
     controls which fields should be displayed.
@@ -16,17 +72,26 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         # Don't pass the 'fields' arg up to the superclass
-        fields = kwargs.pop('fields', None)
+        self.allowed_fields = kwargs.pop('fields', None)
 
         # Instantiate the superclass normally
         super().__init__(*args, **kwargs)
 
-        if fields is not None:
-            # Drop any fields that are not specified in the `fields` argument.
-            allowed = set(fields)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
-                self.fields.pop(field_name)
+    def get_field_templates(self):
+        fields = super().get_field_templates()
+        if self.allowed_fields is None:
+            return fields
+
+        # Only the fields specified in the `fields` argument, computed once per class and fields
+        # so instances only copy the fields they use.
+        subsets = _field_subsets.setdefault(type(self), {})
+        allowed = frozenset(self.allowed_fields)
+        subset = subsets.get(allowed)
+        if subset is None:
+            subset = subsets.setdefault(allowed, OrderedDict(
+                (name, field) for name, field in fields.items() if name in allowed
+            ))
+        return subset
 
 
 class UserSerializer(DynamicFieldsModelSerializer):
@@ -57,16 +122,95 @@ class UserSerializer(DynamicFieldsModelSerializer):
         return value
 
 
+def compile_user_serializer(serializer_class):
+    """
+    Build a function that returns the same representation of a user as `serializer_class`, by
+    reading each attribute and converting it with its field directly, without instantiating the
+    serializer and binding its fields on every response.
+
+    Returns:
+        (function) Takes a user and returns its representation.
+
+    Raises:
+        ImproperlyConfigured: if the serializer has fields that can't be compiled, such as
+            relations, nested serializers, method fields or sources that aren't plain attributes.
+    """
+    serializer = serializer_class()
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        raise ImproperlyConfigured(
+            '{} overrides `to_representation` and cannot be compiled.'.format(
+                serializer_class.__name__
+            )
+        )
+
+    model = serializer_class.Meta.model
+    extractors = []
+    for field_name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        source = field.source_attrs[0] if len(field.source_attrs) == 1 else None
+        if (
+            source is None or
+            callable(getattr(model, source, None)) or
+            isinstance(field, UNCOMPILABLE_FIELDS)
+        ):
+            raise ImproperlyConfigured(
+                'The field `{}` of {} cannot be compiled.'.format(
+                    field_name,
+                    serializer_class.__name__
+                )
+            )
+        extractors.append((field_name, attrgetter(source), field.to_representation))
+    extractors = tuple(extractors)
+
+    def serialize_user(user):
+        data = OrderedDict()
+        for field_name, get_attribute, to_representation in extractors:
+            value = get_attribute(user)
+            data[field_name] = None if value is None else to_representation(value)
+        return data
+
+    return serialize_user
+
+
+@lru_cache(maxsize=None)
 def RegisterSerializerFactory(user_serializer=UserSerializer):
-    class RegisterSerializer(user_serializer):
+    """
+    Returns the register serializer of `user_serializer`, the class is only built once per user
+    serializer.
+    """
+    bases = (user_serializer, )
+    if not issubclass(user_serializer, CachedFieldsMixin):
+        bases = (CachedFieldsMixin, ) + bases
+
+    class RegisterSerializer(*bases):
         password = serializers.CharField(required=True)
 
         class Meta(user_serializer.Meta):
             fields = user_serializer.Meta.fields + ('password',)
 
         def create(self, validated_data):
-            user = User.objects.create_user(**validated_data)
-            token = Token.objects.create(user=user)
+            # Already hashed by the async register view
+            encoded_password = validated_data.pop('encoded_password', None)
+
+            if encoded_password is None and hashing.get_executor() is None:
+                user = User.objects.create_user(**validated_data)
+            else:
+                # Hash in the executor first, then store it over the unusable password that
+                # `create_user` sets when it gets no password.
+                password = validated_data.pop('password')
+                if encoded_password is None:
+                    encoded_password = hashing.make_password(password)
+                user = User.objects.create_user(**validated_data, password=None)
+                user.password = encoded_password
+                user.save(update_fields=['password'])
+
+            token = tokens.issue_token(
+                user,
+                created=True,
+                device=self.context.get('device', '')
+            )
 
             return user, token
 
@@ -87,5 +231,83 @@ class LoginSerializer(DynamicFieldsModelSerializer):
         )
 
 
+class LoginValidator(object):
+    """
+    Validates the login payload like `LoginSerializer(fields=fields)` does, with the same errors,
+    without building a serializer and its fields on every login.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        # Provides the messages and validators of the fields, like null characters prohibition
+        self.char_field = serializers.CharField()
+        self.error_messages = self.char_field.error_messages
+
+    def error(self, code, **kwargs):
+        return ErrorDetail(self.error_messages[code].format(**kwargs), code=code)
+
+    def validate_field(self, data, field_name):
+        # Same checks and order as a required `CharField` that trims whitespace
+        value = data.get(field_name, empty)
+        if value is empty:
+            raise serializers.ValidationError(self.error('required'))
+        if value is None:
+            raise serializers.ValidationError(self.error('null'))
+        value_string = str(value).strip()
+        if value_string == '':
+            raise serializers.ValidationError(self.error('blank'))
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise serializers.ValidationError(self.error('invalid'))
+
+        self.char_field.run_validators(value_string)
+        return value_string
+
+    def validate(self, data):
+        """
+        Returns:
+            (OrderedDict) The validated fields.
+
+        Raises:
+            ValidationError: with the errors of each field.
+        """
+        if not isinstance(data, Mapping):
+            message = serializers.Serializer.default_error_messages['invalid'].format(
+                datatype=type(data).__name__
+            )
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    ErrorDetail(message, code='invalid')
+                ]
+            })
+
+        validated_data = OrderedDict()
+        errors = OrderedDict()
+        for field_name in self.fields:
+            try:
+                validated_data[field_name] = self.validate_field(data, field_name)
+            except serializers.ValidationError as error:
+                errors[field_name] = error.detail
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated_data
+
+
 class PasswordResetSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
+
+
+class RefreshSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=True)
+
+
+class DeviceTokenSerializer(serializers.ModelSerializer):
+    current = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeviceToken
+        fields = ('id', 'device', 'created', 'expires', 'current')
+
+    def get_current(self, instance):
+        auth = getattr(self.context.get('request'), 'auth', None)
+        return isinstance(auth, DeviceToken) and auth.pk == instance.pk
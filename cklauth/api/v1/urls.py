@@ -1,3 +1,4 @@
+import django
 from django.urls import include, path
 
 from . import views
@@ -5,7 +6,33 @@ from . import views
 urlpatterns = [
     path('register/', views.RegisterView.as_view(), name='register'),
     path('login/', views.LoginView.as_view(), name='login'),
+    path('refresh/', views.RefreshView.as_view(), name='refresh'),
+    path('tokens/', views.DeviceTokenListView.as_view(), name='tokens'),
+    path('tokens/<int:pk>/', views.DeviceTokenDetailView.as_view(), name='token'),
     path('social/google/', views.GoogleAuthView.as_view(), name='google'),
     path('social/facebook/', views.FacebookAuthView.as_view(), name='facebook'),
     path('password-reset/', views.password_reset, name='password-reset'),
 ]
+
+if django.VERSION >= (3, 1):
+    from . import async_views
+
+    urlpatterns += [
+        path('register/async/', async_views.AsyncRegisterView.as_view(), name='register-async'),
+        path('login/async/', async_views.AsyncLoginView.as_view(), name='login-async'),
+        path(
+            'password-reset/async/',
+            async_views.AsyncPasswordResetView.as_view(),
+            name='password-reset-async'
+        ),
+        path(
+            'social/google/async/',
+            async_views.AsyncGoogleAuthView.as_view(),
+            name='google-async'
+        ),
+        path(
+            'social/facebook/async/',
+            async_views.AsyncFacebookAuthView.as_view(),
+            name='facebook-async'
+        ),
+    ]
@@ -1,99 +1,198 @@
+import hashlib
 import json
-from pydoc import locate
 
 import requests
 from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.forms import PasswordResetForm
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.http import JsonResponse
 from django.shortcuts import redirect
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 
-from cklauth import constants
-from cklauth.models import SocialAccount
-from .serializers import RegisterSerializerFactory, LoginSerializer, PasswordResetSerializer
+from cklauth import conf, constants, hashing, id_tokens, metrics, providers, ratelimit, tokens
+from cklauth.models import DeviceToken, SocialIdentity
+from cklauth.utils import single_flight
+from .serializers import (
+    RegisterSerializerFactory, PasswordResetSerializer, RefreshSerializer,
+    DeviceTokenSerializer
+)
 
 
 User = get_user_model()
 
 
 class AuthError(Exception):
-    def __init__(self, message, status):
+    def __init__(self, message, status, retry_after=None):
         self.message = message
         self.status = status
+        self.retry_after = retry_after
+
+
+def error_response(error):
+    """
+    Returns the response to an `AuthError` or `HashingQueueFull` error.
+    """
+    if isinstance(error, hashing.HashingQueueFull):
+        error = AuthError(
+            message='Server is busy, try again later.',
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            retry_after=error.retry_after
+        )
+
+    response = JsonResponse({'non_field_errors': [error.message]}, status=error.status)
+    if error.retry_after is not None:
+        response['Retry-After'] = error.retry_after
+    return response
+
+
+def auth_response(user, token, status_code):
+    """
+    Returns the response of a successful login or register, with the user token and data.
+    """
+    data = {
+        'token': token.key,
+        'user': conf.auth_settings().serialize_user(user),
+    }
+    if settings.CKL_REST_AUTH['REFRESH_TOKEN']['ENABLED']:
+        data['refresh_token'] = tokens.issue_refresh_token(
+            user,
+            device_token=token if isinstance(token, DeviceToken) else None
+        )
+
+    return JsonResponse(data, status=status_code)
 
 
 class AuthView(APIView):
     status_code = status.HTTP_200_OK
     permission_classes = (AllowAny, )
+    # Whether `perform_action` hashes a password and must go through admission control
+    hashes_password = False
 
     def post(self, request):
         try:
-            user, token = self.perform_action(request)
-        except AuthError as error:
-            return JsonResponse(
-                {'non_field_errors': [error.message]},
-                status=error.status
-            )
+            if self.hashes_password:
+                with hashing.admission.admit():
+                    user, token = self.perform_action(request)
+            else:
+                user, token = self.perform_action(request)
+        except (AuthError, hashing.HashingQueueFull) as error:
+            return error_response(error)
 
-        UserSerializer = locate(settings.CKL_REST_AUTH.get('USER_SERIALIZER'))
-        return JsonResponse({
-            'token': token.key,
-            'user': UserSerializer(instance=user).data,
-        }, status=self.status_code)
+        return auth_response(user, token, self.status_code)
 
     def perform_action(self, request):
         raise NotImplementedError('The view should implement `perform_login` method')
 
+    def get_device(self, request):
+        """
+        Returns the label of the device being logged in, for device tokens.
+        """
+        return request.data.get('device') or request.META.get('HTTP_USER_AGENT', '')
+
 
 class RegisterView(AuthView):
     status_code = status.HTTP_201_CREATED
+    hashes_password = True
 
     def perform_action(self, request):
-        UserSerializer = locate(settings.CKL_REST_AUTH.get('USER_SERIALIZER'))
-        RegisterSerializer = RegisterSerializerFactory(UserSerializer)
+        RegisterSerializer = RegisterSerializerFactory(conf.auth_settings().user_serializer)
 
-        serializer = RegisterSerializer(data=request.data)
+        serializer = RegisterSerializer(
+            data=request.data,
+            context={'device': self.get_device(request)}
+        )
         serializer.is_valid(raise_exception=True)
 
         return serializer.save()
 
 
 class LoginView(AuthView):
-    def perform_action(self, request):
-        fields = [settings.CKL_REST_AUTH['LOGIN_FIELD'], 'password']
-        serializer = LoginSerializer(data=request.data, fields=fields)
+    hashes_password = True
 
-        serializer.is_valid(raise_exception=True)
-        login_field = serializer.validated_data[settings.CKL_REST_AUTH['LOGIN_FIELD']]
-        password = serializer.validated_data['password']
+    def perform_action(self, request):
+        validated_data = conf.auth_settings().login_validator.validate(request.data)
+        login_field = validated_data[settings.CKL_REST_AUTH['LOGIN_FIELD']]
+        password = validated_data['password']
+        ratelimit.check(request, 'login', login_field)
         user = authenticate(username=login_field, password=password)
 
         if not user:
             raise AuthError(message='Wrong credentials.', status=status.HTTP_401_UNAUTHORIZED)
 
-        token, _ = Token.objects.get_or_create(user=user)
-        return user, token
+        return user, tokens.issue_token(user, device=self.get_device(request))
+
+
+class RefreshView(APIView):
+    permission_classes = (AllowAny, )
+
+    def post(self, request):
+        serializer = RefreshSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            user, refresh_token = tokens.rotate_refresh_token(
+                serializer.validated_data['refresh_token']
+            )
+            token = tokens.issue_refreshed_token(user, refresh_token)
+        except tokens.InvalidRefreshToken:
+            return JsonResponse(
+                {'non_field_errors': ['Invalid refresh token.']},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        return JsonResponse({
+            'token': token.key,
+            'refresh_token': refresh_token,
+        }, status=status.HTTP_200_OK)
+
+
+class DeviceTokenListView(APIView):
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        queryset = DeviceToken.objects.filter(user=request.user).order_by('-created')
+        serializer = DeviceTokenSerializer(queryset, many=True, context={'request': request})
+        return JsonResponse(serializer.data, safe=False, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        tokens.revoke_all_tokens(request.user.pk)
+        return JsonResponse({}, status=status.HTTP_200_OK)
+
+
+class DeviceTokenDetailView(APIView):
+    permission_classes = (IsAuthenticated, )
+
+    def delete(self, request, pk):
+        deleted, _ = DeviceToken.objects.filter(pk=pk, user=request.user).delete()
+        if not deleted:
+            raise NotFound()
+
+        return JsonResponse({}, status=status.HTTP_200_OK)
 
 
 class SocialAuthView(AuthView):
     def __init__(self, *args, **kwargs):
-        platform_settings = settings.CKL_REST_AUTH.get(self.platform, {})
-        if not platform_settings:
+        platform_settings = conf.auth_settings().providers.get(self.platform)
+        if platform_settings is None:
             raise ImproperlyConfigured(
                 'Add {} CLIENT_ID and REDIRECT_URI to settings.'.format(self.platform)
             )
 
-        self.CLIENT_ID = platform_settings.get('CLIENT_ID')
-        self.CLIENT_SECRET = platform_settings.get('CLIENT_SECRET')
-        self.REDIRECT_URI = platform_settings.get('REDIRECT_URI')
-        self.USER_INFO_MAPPING = platform_settings.get('USER_INFO_MAPPING')
-        self.AUTH_FIELD_GENERATOR = platform_settings.get('AUTH_FIELD_GENERATOR')
+        self.CLIENT_ID = platform_settings.client_id
+        self.CLIENT_SECRET = platform_settings.client_secret
+        self.REDIRECT_URI = platform_settings.redirect_uri
+        self.map_user_info = platform_settings.map_user_info
+        self.auth_field_generator = platform_settings.auth_field_generator
+        self.VERIFY_ID_TOKEN = platform_settings.verify_id_token
+        self.ID_TOKEN_LEEWAY = platform_settings.id_token_leeway
 
         super().__init__(*args, **kwargs)
 
@@ -101,14 +200,75 @@ class SocialAuthView(AuthView):
         if response.status_code != status.HTTP_200_OK:
             raise AuthError(message='Bad token.', status=status.HTTP_400_BAD_REQUEST)
 
-    def get_access_token(self, request):
-        if request.data.get('access_token'):
-            return request.data.get('access_token')
+    def call_provider(self, endpoint, method, url, **kwargs):
+        """
+        Make a request to the provider with the shared `cklauth.providers` client.
+
+        Raises:
+            AuthError: if the provider can't be reached.
+        """
+        try:
+            return providers.client.request(
+                '{}.{}'.format(self.platform.lower(), endpoint),
+                method,
+                url,
+                **kwargs
+            )
+        except (requests.RequestException, providers.CircuitOpen) as error:
+            raise self.provider_error(error)
+
+    def provider_error(self, error):
+        if isinstance(error, providers.CircuitOpen):
+            return AuthError(
+                message='{} is unavailable, try again later.'.format(self.platform.title()),
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                retry_after=error.retry_after
+            )
+
+        return AuthError(
+            message='Cannot reach {}.'.format(self.platform.title()),
+            status=status.HTTP_502_BAD_GATEWAY
+        )
+
+    def get_token_data(self, request):
+        """
+        Returns:
+            (dict) The provider token response, or the tokens sent by the client.
+        """
+        token_data = self.get_client_token_data(request)
+        if token_data is not None:
+            return token_data
+
+        response = self.call_provider(
+            'token',
+            'post',
+            self.token_url,
+            data=self.get_token_payload(request)
+        )
+
+        self.validate_response(response)
+
+        return response.json()
+
+    def get_client_token_data(self, request):
+        """
+        Returns:
+            (dict) The tokens sent by the client, or None if it sent an authorization code.
+        """
+        if not request.data.get('access_token'):
+            return None
+
+        return {
+            'access_token': request.data.get('access_token'),
+            'id_token': request.data.get('id_token'),
+            'expires_in': request.data.get('expires_in'),
+        }
 
+    def get_token_payload(self, request):
         if not request.data.get('code'):
             raise AuthError(message='Missing auth token.', status=status.HTTP_400_BAD_REQUEST)
 
-        payload = {
+        return {
             'client_id': self.CLIENT_ID,
             'client_secret': self.CLIENT_SECRET,
             'grant_type': 'authorization_code',
@@ -116,72 +276,168 @@ class SocialAuthView(AuthView):
             'code': request.data['code'],
         }
 
-        response = requests.post(self.token_url, data=payload)
+    def get_access_token(self, request):
+        return self.get_token_data(request)['access_token']
+
+    def fetch_user_info(self, request):
+        token_data = self.get_token_data(request)
+        return self.get_cached_user_info(token_data['access_token'], token_data.get('expires_in'))
+
+    def get_cached_user_info(self, access_token, expires_in=None):
+        """
+        Returns `get_user_info(access_token)`, cached by a hash of the access token for
+        `CKL_REST_AUTH['USER_INFO_CACHE']['TIMEOUT']` seconds, or until the token expires if
+        that is sooner, so clients retrying the same token don't repeat the provider call.
+        """
+        cache_key, timeout = self.user_info_cache(access_token, expires_in)
+        if not timeout:
+            return self.get_user_info(access_token)
+
+        user_info = cache.get(cache_key)
+        if user_info is not None:
+            metrics.incr('providers.{}.user_info.cache_hits'.format(self.platform.lower()))
+            return user_info
 
-        self.validate_response(response)
+        user_info = self.get_user_info(access_token)
+        cache.set(cache_key, user_info, timeout)
+        return user_info
+
+    def user_info_cache(self, access_token, expires_in=None):
+        """
+        Returns:
+            (tuple) Cache key of the user info of `access_token` and the seconds to cache it for,
+            None if it must not be cached.
+        """
+        timeout = settings.CKL_REST_AUTH['USER_INFO_CACHE']['TIMEOUT']
+        try:
+            if timeout and expires_in is not None:
+                timeout = min(timeout, int(expires_in))
+        except (TypeError, ValueError):
+            pass
+
+        cache_key = 'cklauth:user-info:{}:{}'.format(
+            self.platform,
+            hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+        )
+        return cache_key, timeout if timeout and timeout > 0 else None
 
-        return response.json()['access_token']
+    def get_user_info(self, access_token):
+        url, kwargs = self.get_user_info_request(access_token)
+        return self.parse_user_info(self.call_provider('user_info', 'get', url, **kwargs))
+
+    def get_user_info_request(self, access_token):
+        """
+        Returns:
+            (tuple) URL and `requests` keyword arguments of the provider user info call.
+        """
+        raise NotImplementedError('The view should implement `get_user_info_request` method')
+
+    def parse_user_info(self, response):
+        if response.status_code != status.HTTP_200_OK:
+            raise AuthError(message='Cannot get user info.', status=status.HTTP_401_UNAUTHORIZED)
+
+        return response.json()
 
     def create_user(self, user_info, extra_fields={}):
-        register_info = {
-            register_key: (
-                provider_key(user_info)
-                if callable(provider_key)
-                else user_info.get(provider_key)
-            )
-            for register_key, provider_key in self.USER_INFO_MAPPING.items()
-        }
+        register_info = self.map_user_info(user_info)
 
-        if self.AUTH_FIELD_GENERATOR:
-            auth_field_generator = locate(self.AUTH_FIELD_GENERATOR)
-            register_info[User.USERNAME_FIELD] = auth_field_generator(register_info)
+        if self.auth_field_generator:
+            register_info[User.USERNAME_FIELD] = self.auth_field_generator(register_info)
 
         register_info.update(extra_fields)
 
-        UserSerializer = locate(settings.CKL_REST_AUTH.get('USER_SERIALIZER'))
-        serializer = UserSerializer(data=register_info)
+        serializer = conf.auth_settings().user_serializer(data=register_info)
         serializer.is_valid(raise_exception=True)
 
         return User.objects.create_user(**serializer.data)
 
-    def perform_action(self, request):
-        access_token = self.get_access_token(request)
-        user_info = self.get_user_info(access_token)
-
-        try:
-            # email registered with social account
-            social_account = SocialAccount.objects.get(user__email=user_info.get('email'))
-            user = social_account.user
-            if not getattr(social_account, self.social_account_field):
-                setattr(social_account, self.social_account_field, user_info.get('id'))
-                social_account.save()
-        except SocialAccount.DoesNotExist:
-            try:
-                # email registered without social account
-                user = User.objects.get(email=user_info.get('email'))
-                raise AuthError(
-                    message='Registered with email.',
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            except User.DoesNotExist:
-                # user and social account don't exist
-                extra_fields = request.data.get('user_extra_fields', {})
-                user = self.create_user(user_info, extra_fields)
+    def get_social_user(self, user_info):
+        """
+        Find the user of a social identity in one indexed query, or two the first time the user
+        logs in with this provider.
+
+        Returns:
+            (User) The user registered with the social identity, with its token loaded, or None
+            if there is none yet.
+
+        Raises:
+            AuthError: if the email was registered without a social account.
+        """
+        provider = self.platform.lower()
+        uid = str(user_info.get('id'))
+        identity = SocialIdentity.objects.select_related('user__auth_token').filter(
+            provider=provider,
+            uid=uid
+        ).first()
+        if identity is not None:
+            return identity.user
+
+        user = User.objects.select_related('auth_token').filter(
+            email=user_info.get('email')
+        ).annotate(
+            has_social_identity=Exists(SocialIdentity.objects.filter(user=OuterRef('pk')))
+        ).order_by('-has_social_identity', 'pk').first()
+        if user is None:
+            return None
+
+        # email registered without social account
+        if not user.has_social_identity:
+            raise AuthError(
+                message='Registered with email.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-                SocialAccount.objects.create(**{
-                    'user': user,
-                    self.social_account_field: user_info.get('id')
-                })
+        # email registered with another social provider
+        SocialIdentity.objects.bulk_create(
+            [SocialIdentity(user=user, provider=provider, uid=uid)],
+            ignore_conflicts=True
+        )
+        return user
 
-                self.status_code = status.HTTP_201_CREATED
+    def perform_action(self, request):
+        """
+        Query budget, besides the provider calls and the user serializer validation: existing
+        identity, 1 query; new provider for an existing user, 3; email registered without social
+        account, 2; new user, 7, with the inserts in a single transaction.
+        """
+        return self.login_social_user(request, self.fetch_user_info(request))
+
+    def login_social_user(self, request, user_info):
+        """
+        Find or register the user of the social identity described by `user_info`.
+
+        Returns:
+            (tuple) The user and its token.
+        """
+        user = self.get_social_user(user_info)
+        if user is not None:
+            return user, tokens.issue_token(user, device=self.get_device(request))
+
+        # Concurrent logins of a new identity wait for the first one to register it, then
+        # find its user instead of failing to create another one
+        lock_key = 'cklauth:social-login:{}:{}'.format(self.platform, user_info.get('id'))
+        with single_flight(lock_key):
+            user = self.get_social_user(user_info)
+            if user is not None:
+                return user, tokens.issue_token(user, device=self.get_device(request))
+
+            # user and social account don't exist
+            extra_fields = request.data.get('user_extra_fields', {})
+            with transaction.atomic(savepoint=False):
+                user = self.create_user(user_info, extra_fields)
+                SocialIdentity.objects.create(
+                    user=user,
+                    provider=self.platform.lower(),
+                    uid=str(user_info.get('id'))
+                )
+                token = tokens.issue_token(user, created=True, device=self.get_device(request))
 
-        token, _ = Token.objects.get_or_create(user=user)
+        self.status_code = status.HTTP_201_CREATED
         return user, token
 
 
 class GoogleAuthView(SocialAuthView):
     platform = 'GOOGLE'
-    social_account_field = 'google_id'
     token_url = constants.GOOGLE_TOKEN_URL
 
     def get(self, request, format=None):
@@ -198,15 +454,51 @@ class GoogleAuthView(SocialAuthView):
         request = requests.Request('GET', constants.GOOGLE_AUTH_URL, params=payload).prepare()
         return redirect(request.url)
 
-    def get_user_info(self, access_token):
-        response = requests.get(constants.GOOGLE_USER_URL, headers={
-            'Authorization': 'Bearer %s' % access_token
-        })
+    def fetch_user_info(self, request):
+        if not self.VERIFY_ID_TOKEN:
+            return super().fetch_user_info(request)
 
-        if response.status_code != status.HTTP_200_OK:
-            raise AuthError(message='Cannot get user info', status=status.HTTP_401_UNAUTHORIZED)
+        token_data = self.get_token_data(request)
+        if not token_data.get('id_token'):
+            return self.get_cached_user_info(
+                token_data['access_token'],
+                token_data.get('expires_in')
+            )
 
-        return response.json()
+        return self.get_id_token_user_info(token_data['id_token'])
+
+    def get_id_token_user_info(self, id_token):
+        """
+        Returns:
+            (dict) The user information of a verified ID token, with the same keys as the user
+            info endpoint response.
+        """
+        try:
+            claims = id_tokens.verify_id_token(
+                id_token,
+                audience=self.CLIENT_ID,
+                jwks_url=constants.GOOGLE_JWKS_URL,
+                leeway=self.ID_TOKEN_LEEWAY
+            )
+        except id_tokens.InvalidIDToken as error:
+            raise AuthError(message=str(error), status=status.HTTP_401_UNAUTHORIZED)
+        except (requests.RequestException, providers.CircuitOpen) as error:
+            raise self.provider_error(error)
+
+        return {
+            key: claims[claim]
+            for key, claim in (
+                ('id', 'sub'), ('email', 'email'), ('verified_email', 'email_verified'),
+                ('name', 'name'), ('given_name', 'given_name'),
+                ('family_name', 'family_name'), ('picture', 'picture'), ('locale', 'locale'),
+            )
+            if claim in claims
+        }
+
+    def get_user_info_request(self, access_token):
+        return constants.GOOGLE_USER_URL, {
+            'headers': {'Authorization': 'Bearer %s' % access_token},
+        }
 
     def validate_response(self, response):
         if response.status_code != status.HTTP_200_OK:
@@ -215,7 +507,6 @@ class GoogleAuthView(SocialAuthView):
 
 class FacebookAuthView(SocialAuthView):
     platform = 'FACEBOOK'
-    social_account_field = 'facebook_id'
     token_url = constants.FACEBOOK_TOKEN_URL
 
     def get(self, request, format=None):
@@ -229,17 +520,11 @@ class FacebookAuthView(SocialAuthView):
         request = requests.Request('GET', constants.FACEBOOK_AUTH_URL, params=payload).prepare()
         return redirect(request.url)
 
-    def get_user_info(self, access_token):
-        response = requests.get(constants.FACEBOOK_USER_URL, headers={
-            'Authorization': 'Bearer %s' % access_token
-        }, params={
-            'fields': {'email,first_name,last_name'}
-        })
-
-        if response.status_code != status.HTTP_200_OK:
-            raise AuthError(message='Cannot get user info.', status=status.HTTP_401_UNAUTHORIZED)
-
-        return response.json()
+    def get_user_info_request(self, access_token):
+        return constants.FACEBOOK_USER_URL, {
+            'headers': {'Authorization': 'Bearer %s' % access_token},
+            'params': {'fields': 'email,first_name,last_name'},
+        }
 
 
 @api_view(['POST',])
@@ -247,13 +532,18 @@ class FacebookAuthView(SocialAuthView):
 def password_reset(request):
     serializer = PasswordResetSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
+    ratelimit.check(request, 'password_reset', serializer.validated_data['email'])
 
-    form = PasswordResetForm(serializer.validated_data)
+    send_password_reset(request, serializer.validated_data)
+
+    return JsonResponse(request.data, status=status.HTTP_200_OK)
+
+
+def send_password_reset(request, data):
+    form = PasswordResetForm(data)
     if form.is_valid():
         form.save(
             from_email=settings.CKL_REST_AUTH.get('FROM_EMAIL'),
             email_template_name='registration/password_reset_email.html',
             request=request
         )
-
-    return JsonResponse(request.data, status=status.HTTP_200_OK)
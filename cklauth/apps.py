@@ -10,13 +10,84 @@ class AuthConfig(AppConfig):
             'LOGIN_FIELD': 'email',
             'REGISTER_FIELDS': ('username', 'email'),
             'USER_SERIALIZER': 'cklauth.api.v1.serializers.UserSerializer',
+            'COMPILED_USER_SERIALIZER': False,
+            'TOKEN_TYPE': 'database',
+            'TOKEN_TTL': None,
 
             # Override defaults
             **settings.CKL_REST_AUTH,
 
+            'HASHING': {
+                'EXECUTOR': None,
+                'WORKERS': 2,
+                'MAX_QUEUE': 8,
+                'MAX_IN_FLIGHT': None,
+                **settings.CKL_REST_AUTH.get('HASHING', {}),
+            },
+            'RATE_LIMIT': {
+                'IDENTIFIER_RATE': None,
+                'IP_RATE': None,
+                **settings.CKL_REST_AUTH.get('RATE_LIMIT', {}),
+            },
+            'TOKEN_CACHE': {
+                'TIMEOUT': 300,
+                'LOCAL_TIMEOUT': 5,
+                **settings.CKL_REST_AUTH.get('TOKEN_CACHE', {}),
+            },
+            'INVALID_TOKEN_CACHE': {
+                'TIMEOUT': None,
+                'LOCAL_TIMEOUT': 5,
+                'BLOOM_FILTER_SIZE': None,
+                **settings.CKL_REST_AUTH.get('INVALID_TOKEN_CACHE', {}),
+            },
+            'SIGNED_TOKEN': {
+                'KEYS': None,
+                'MAX_AGE': 900,
+                'SALT': 'cklauth.tokens',
+                **settings.CKL_REST_AUTH.get('SIGNED_TOKEN', {}),
+            },
+            'REFRESH_TOKEN': {
+                'ENABLED': False,
+                'MAX_AGE': 30 * 24 * 60 * 60,
+                **settings.CKL_REST_AUTH.get('REFRESH_TOKEN', {}),
+            },
+            'DEVICE_TOKEN': {
+                'MAX_AGE': None,
+                'HASH_KEY': None,
+                **settings.CKL_REST_AUTH.get('DEVICE_TOKEN', {}),
+            },
+            'USAGE_TRACKING': {
+                'ENABLED': False,
+                'FLUSH_INTERVAL': 60,
+                **settings.CKL_REST_AUTH.get('USAGE_TRACKING', {}),
+            },
+            'PROVIDER_HTTP': {
+                'CONNECT_TIMEOUT': 3.05,
+                'READ_TIMEOUT': 10,
+                'RETRIES': 2,
+                'BACKOFF_FACTOR': 0.3,
+                'POOL_SIZE': 10,
+                **settings.CKL_REST_AUTH.get('PROVIDER_HTTP', {}),
+            },
+            'USER_INFO_CACHE': {
+                'TIMEOUT': None,
+                **settings.CKL_REST_AUTH.get('USER_INFO_CACHE', {}),
+            },
+            'CIRCUIT_BREAKER': {
+                'ENABLED': False,
+                'FAILURE_RATE': 0.5,
+                'SLOW_CALL_DURATION': 5,
+                'MIN_CALLS': 10,
+                'WINDOW': 60,
+                'OPEN_TIMEOUT': 30,
+                **settings.CKL_REST_AUTH.get('CIRCUIT_BREAKER', {}),
+            },
+
             # Social defaults
             'GOOGLE': {
                 'AUTH_FIELD_GENERATOR': 'cklauth.utils.auth_field_generator',
+                'VERIFY_ID_TOKEN': False,
+                'ID_TOKEN_LEEWAY': 60,
                 'USER_INFO_MAPPING': {
                     'first_name': 'given_name',
                     'last_name': 'family_name',
@@ -34,3 +105,8 @@ class AuthConfig(AppConfig):
                 **settings.CKL_REST_AUTH.get('FACEBOOK', {}),
             }
         })
+
+        from cklauth import conf, signals  # noqa
+
+        # Fail on startup when misconfigured
+        conf.auth_settings()
@@ -1,16 +1,288 @@
+import hashlib
+from functools import lru_cache
+
 from django.contrib.auth import get_user_model, settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signing import Signer
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.db import router
+from rest_framework import exceptions
 from rest_framework.authentication import TokenAuthentication
 
+from cklauth import hashing, tokens, usage
+from cklauth.caches import BloomFilter, LocalTTLCache
+from cklauth.models import DeviceToken
+
 
 User = get_user_model()
 
+signing_separator = Signer().sep
+
+
+def key_digest(key):
+    # Token keys are hashed before being used in cache keys, so untrusted query string values
+    # always make valid cache keys and keys are never stored in the clear
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def token_cache_key(key):
+    return 'cklauth:token:{}'.format(key_digest(key))
+
+
+def invalid_token_cache_key(key):
+    return 'cklauth:invalid-token:{}'.format(key_digest(key))
+
+
+_invalid_token_filter = (None, None)
+
+
+def invalid_token_filter():
+    """
+    Returns the per-process Bloom filter of recently rejected token keys, or None if disabled.
+    """
+    global _invalid_token_filter
+
+    config = settings.CKL_REST_AUTH['INVALID_TOKEN_CACHE']
+    key = (config['BLOOM_FILTER_SIZE'], config['TIMEOUT'])
+    if not key[0]:
+        return None
+
+    current_key, bloom_filter = _invalid_token_filter
+    if current_key != key:
+        bloom_filter = BloomFilter(size=key[0], max_age=key[1])
+        _invalid_token_filter = (key, bloom_filter)
+
+    return bloom_filter
+
 
 class TokenAuthSupportQueryString(TokenAuthentication):
+    """
+    Token authentication that also accepts the key in the `auth_token` query string parameter.
+    Tokens older than `CKL_REST_AUTH['TOKEN_TTL']` seconds, when set, are rejected. With
+    `CKL_REST_AUTH['USAGE_TRACKING']['ENABLED']`, token and user usage is recorded by
+    `cklauth.usage`.
+
+    When `CKL_REST_AUTH['INVALID_TOKEN_CACHE']['TIMEOUT']` is set, keys that don't exist are
+    remembered in the Django cache and in a small per-process LRU, so clients retrying with a
+    deleted token are rejected without querying the database.
+    """
+    invalid_cache = LocalTTLCache(max_size=4096)
+
     def authenticate(self, request):
         if 'auth_token' in request.query_params and 'HTTP_AUTHORIZATION' not in request.META:
-            return self.authenticate_credentials(request.query_params.get('auth_token'))
+            result = self.authenticate_credentials(request.query_params.get('auth_token'))
         else:
-            return super(TokenAuthSupportQueryString, self).authenticate(request)
+            result = super(TokenAuthSupportQueryString, self).authenticate(request)
+
+        if result is not None and settings.CKL_REST_AUTH['USAGE_TRACKING']['ENABLED']:
+            usage.tracker.touch(*result)
+
+        return result
+
+    def authenticate_credentials(self, key):
+        config = settings.CKL_REST_AUTH['INVALID_TOKEN_CACHE']
+        if not config['TIMEOUT']:
+            user, token = super().authenticate_credentials(key)
+            self.check_expiry(token)
+            return user, token
+
+        if self.is_known_invalid(key, config):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            self.remember_invalid(key, config)
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        self.check_expiry(token)
+        return token.user, token
+
+    def check_expiry(self, token):
+        if tokens.token_expired(token):
+            raise exceptions.AuthenticationFailed('Token has expired.')
+
+    def is_known_invalid(self, key, config):
+        bloom_filter = invalid_token_filter()
+        if bloom_filter is not None and key not in bloom_filter:
+            # Not rejected by this process recently, skip the cache round trip
+            return False
+
+        cache_key = invalid_token_cache_key(key)
+        if self.invalid_cache.get(cache_key):
+            return True
+
+        if cache.get(cache_key):
+            self.invalid_cache.set(cache_key, True, config['LOCAL_TIMEOUT'])
+            return True
+
+        return False
+
+    def remember_invalid(self, key, config):
+        cache_key = invalid_token_cache_key(key)
+        cache.set(cache_key, True, config['TIMEOUT'])
+        self.invalid_cache.set(cache_key, True, config['LOCAL_TIMEOUT'])
+
+        bloom_filter = invalid_token_filter()
+        if bloom_filter is not None:
+            bloom_filter.add(key)
+
+
+def user_token_cache_key(user_pk):
+    return 'cklauth:token-user:{}'.format(user_pk)
+
+
+@lru_cache(maxsize=None)
+def cached_user_fields():
+    """
+    Returns:
+        (tuple) The user attributes kept in the token cache. Other fields are loaded from the
+        database the first time they are accessed.
+    """
+    names = [User._meta.pk.attname, User._meta.get_field(User.USERNAME_FIELD).attname]
+    try:
+        names.append(User._meta.get_field('is_active').attname)
+    except FieldDoesNotExist:
+        pass
+    return tuple(names)
+
+
+class CachedTokenAuthentication(TokenAuthSupportQueryString):
+    """
+    Token authentication that resolves token keys to users from the Django cache, with a small
+    per-process LRU in front of it, instead of querying the database on every request.
+
+    Entries expire after `CKL_REST_AUTH['TOKEN_CACHE']['TIMEOUT']` seconds and are invalidated
+    when the token or its user is saved or deleted (see `cklauth.signals`). Other processes keep
+    their local copy for up to `LOCAL_TIMEOUT` seconds.
+    """
+    local_cache = LocalTTLCache(max_size=1024)
+
+    def authenticate_credentials(self, key):
+        config = settings.CKL_REST_AUTH['TOKEN_CACHE']
+        cache_key = token_cache_key(key)
+
+        entry = self.local_cache.get(cache_key)
+        if entry is None:
+            entry = cache.get(cache_key)
+            if entry is None:
+                user, token = super().authenticate_credentials(key)
+                entry = self.make_entry(user, token)
+                cache.set_many({
+                    cache_key: entry,
+                    user_token_cache_key(user.pk): cache_key,
+                }, config['TIMEOUT'])
+                self.local_cache.set(cache_key, entry, config['LOCAL_TIMEOUT'])
+                return user, token
+
+            self.local_cache.set(cache_key, entry, config['LOCAL_TIMEOUT'])
+
+        return self.load_entry(key, entry)
+
+    def make_entry(self, user, token):
+        fields = cached_user_fields()
+        return {
+            'user_fields': fields,
+            'user_values': tuple(getattr(user, name) for name in fields),
+            'created': token.created,
+        }
+
+    def load_entry(self, key, entry):
+        user = User.from_db(router.db_for_read(User), entry['user_fields'], entry['user_values'])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        model = self.get_model()
+        token = model.from_db(
+            router.db_for_read(model),
+            ['key', 'user_id', 'created'],
+            [key, user.pk, entry['created']]
+        )
+        token.user = user
+        self.check_expiry(token)
+
+        return user, token
+
+
+class SignedTokenAuthentication(TokenAuthSupportQueryString):
+    """
+    Authenticates the signed tokens issued with `CKL_REST_AUTH['TOKEN_TYPE'] = 'signed'`.
+
+    Tokens are verified in memory, plus one cache lookup for the user revocation counter. The
+    returned user only has its primary key loaded, other fields are fetched on first access.
+    Keys that aren't signed tokens are left to the next authentication class.
+    """
+
+    def authenticate_credentials(self, key):
+        if signing_separator not in key:
+            return None
+
+        pk_field = User._meta.pk
+        user_pk = pk_field.to_python(tokens.verify_signed_token(key))
+        user = User.from_db(router.db_for_read(User), [pk_field.attname], [user_pk])
+
+        return user, tokens.SignedToken(key, user.pk)
+
+
+class DeviceTokenAuthentication(TokenAuthSupportQueryString):
+    """
+    Authenticates the per-device tokens issued with `CKL_REST_AUTH['TOKEN_TYPE'] = 'device'`,
+    with one indexed query by key prefix and a constant time comparison of the key digest.
+    """
+    model = DeviceToken
+
+    def authenticate_credentials(self, key):
+        config = settings.CKL_REST_AUTH['INVALID_TOKEN_CACHE']
+        if config['TIMEOUT'] and self.is_known_invalid(key, config):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        token = self.get_token(key)
+        if token is None:
+            if config['TIMEOUT']:
+                self.remember_invalid(key, config)
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        if token.expires is not None and token.expires <= timezone.now():
+            raise exceptions.AuthenticationFailed('Token has expired.')
+
+        return token.user, token
+
+    def get_token(self, key):
+        candidates = self.model.objects.select_related('user').filter(
+            key_prefix=key[:self.model.PREFIX_LENGTH]
+        )
+        digest = self.model.make_digest(key)
+        for token in candidates:
+            if constant_time_compare(token.digest, digest):
+                token.key = key
+                return token
+
+        return None
+
+
+def invalidate_token(key):
+    cache_key = token_cache_key(key)
+    invalid_cache_key = invalid_token_cache_key(key)
+    cache.delete_many([cache_key, invalid_cache_key])
+    CachedTokenAuthentication.local_cache.delete(cache_key)
+    TokenAuthSupportQueryString.invalid_cache.delete(invalid_cache_key)
+
+
+def invalidate_user_token(user_pk):
+    index_key = user_token_cache_key(user_pk)
+    cache_key = cache.get(index_key)
+    if cache_key:
+        cache.delete_many([cache_key, index_key])
+        CachedTokenAuthentication.local_cache.delete(cache_key)
 
 
 class EmailOrUsernameModelBackend(object):
@@ -18,7 +290,7 @@ class EmailOrUsernameModelBackend(object):
         kwargs = {settings.CKL_REST_AUTH['LOGIN_FIELD']: username}
         try:
             user = User.objects.filter(**kwargs).order_by('id')[0]
-            if user.check_password(password):
+            if hashing.check_password(user, password):
                 return user
         except IndexError:
             return None
@@ -0,0 +1,98 @@
+"""
+Small in-process caches used in front of the Django cache for the hottest lookups.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalTTLCache(object):
+    """
+    A thread-safe, size bounded LRU cache whose entries also expire after a timeout.
+
+    Entries only live in the current process, so keep timeouts short for data that other
+    processes may invalidate.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                expires, value = self.entries[key]
+            except KeyError:
+                return default
+
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return default
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if not timeout:
+            return
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class BloomFilter(object):
+    """
+    A thread-safe Bloom filter of strings that forgets everything every `max_age` seconds.
+
+    Membership tests may give false positives, never false negatives (within the current age).
+    """
+
+    def __init__(self, size, hashes=4, max_age=None):
+        self.size = size
+        self.hashes = hashes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.bits = bytearray((self.size + 7) // 8)
+        self.reset_at = time.monotonic() + self.max_age if self.max_age else None
+
+    def positions(self, value):
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:(i + 1) * 4], 'big') % self.size
+
+    def expire(self):
+        if self.reset_at is not None and self.reset_at <= time.monotonic():
+            self.clear()
+
+    def add(self, value):
+        with self.lock:
+            self.expire()
+            for position in self.positions(value):
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        with self.lock:
+            self.expire()
+            return all(
+                self.bits[position >> 3] & (1 << (position & 7))
+                for position in self.positions(value)
+            )
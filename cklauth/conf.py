@@ -0,0 +1,170 @@
+"""
+`CKL_REST_AUTH` compiled for the views.
+
+`AuthConfig.ready` compiles the settings once at startup, so misconfiguration (a dotted path that
+can't be imported, an unknown token type, a bad user info mapping, a missing optional dependency)
+fails there instead of on the first login, and the views don't import dotted paths, build the
+login validator or walk the user info mapping per request. The compiled settings are rebuilt when
+`settings.CKL_REST_AUTH` is replaced, e.g. by tests.
+"""
+import threading
+from collections import namedtuple
+from operator import methodcaller
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from cklauth import id_tokens
+
+
+TOKEN_TYPES = ('database', 'signed', 'device')
+PROVIDERS = ('GOOGLE', 'FACEBOOK')
+
+AuthSettings = namedtuple('AuthSettings', [
+    'user_serializer',
+    'serialize_user',
+    'login_validator',
+    'providers',
+])
+
+ProviderSettings = namedtuple('ProviderSettings', [
+    'client_id',
+    'client_secret',
+    'redirect_uri',
+    'map_user_info',
+    'auth_field_generator',
+    'verify_id_token',
+    'id_token_leeway',
+])
+
+
+def import_setting(name, path):
+    """
+    Returns the object at the dotted `path` of the `name` setting, or `path` itself if it was
+    given as an object.
+
+    Raises:
+        ImproperlyConfigured: if the path can't be imported.
+    """
+    if not isinstance(path, str):
+        return path
+
+    try:
+        return import_string(path)
+    except ImportError as error:
+        raise ImproperlyConfigured(
+            "CKL_REST_AUTH{} '{}' could not be imported: {}".format(name, path, error)
+        )
+
+
+def compile_user_info_mapping(name, mapping):
+    """
+    Returns a function that builds the register fields from the provider user info, according to
+    `USER_INFO_MAPPING`. Its values are user info keys or callables that take the user info.
+    """
+    getters = []
+    for register_key, provider_key in (mapping or {}).items():
+        if isinstance(provider_key, str):
+            getters.append((register_key, methodcaller('get', provider_key)))
+        elif callable(provider_key):
+            getters.append((register_key, provider_key))
+        else:
+            raise ImproperlyConfigured(
+                "CKL_REST_AUTH{}['{}'] must be a user info key or a callable.".format(
+                    name,
+                    register_key
+                )
+            )
+    getters = tuple(getters)
+
+    def map_user_info(user_info):
+        return {register_key: getter(user_info) for register_key, getter in getters}
+
+    return map_user_info
+
+
+def compile_provider(platform, config):
+    name = "['{}']".format(platform)
+    generator = config.get('AUTH_FIELD_GENERATOR')
+    if generator is not None:
+        generator = import_setting(name + "['AUTH_FIELD_GENERATOR']", generator)
+
+    if config.get('VERIFY_ID_TOKEN') and id_tokens.jwt is None:
+        raise ImproperlyConfigured(
+            "CKL_REST_AUTH{}['VERIFY_ID_TOKEN'] requires PyJWT, "
+            "`pip install cklauth[google]`.".format(name)
+        )
+
+    return ProviderSettings(
+        client_id=config.get('CLIENT_ID'),
+        client_secret=config.get('CLIENT_SECRET'),
+        redirect_uri=config.get('REDIRECT_URI'),
+        map_user_info=compile_user_info_mapping(
+            name + "['USER_INFO_MAPPING']",
+            config.get('USER_INFO_MAPPING')
+        ),
+        auth_field_generator=generator,
+        verify_id_token=config.get('VERIFY_ID_TOKEN', False),
+        id_token_leeway=config.get('ID_TOKEN_LEEWAY', 0),
+    )
+
+
+def compile_settings(config):
+    """
+    Validate `CKL_REST_AUTH` and compile it.
+
+    Returns:
+        (AuthSettings) The compiled settings.
+
+    Raises:
+        ImproperlyConfigured: if the settings are not valid.
+    """
+    if config.get('TOKEN_TYPE') not in TOKEN_TYPES:
+        raise ImproperlyConfigured(
+            "CKL_REST_AUTH['TOKEN_TYPE'] must be one of {}.".format(', '.join(TOKEN_TYPES))
+        )
+
+    # Imports the user model, so not at the top of the module
+    from cklauth.api.v1.serializers import LoginValidator, compile_user_serializer
+
+    user_serializer = import_setting("['USER_SERIALIZER']", config['USER_SERIALIZER'])
+    if config['COMPILED_USER_SERIALIZER']:
+        serialize_user = compile_user_serializer(user_serializer)
+    else:
+        def serialize_user(user):
+            return user_serializer(instance=user).data
+
+    return AuthSettings(
+        user_serializer=user_serializer,
+        serialize_user=serialize_user,
+        login_validator=LoginValidator((config['LOGIN_FIELD'], 'password')),
+        providers=MappingProxyType({
+            platform: compile_provider(platform, config[platform])
+            for platform in PROVIDERS
+            if config.get(platform)
+        }),
+    )
+
+
+_lock = threading.Lock()
+_compiled = (None, None)
+
+
+def auth_settings():
+    """
+    Returns the `AuthSettings` compiled from the current `settings.CKL_REST_AUTH`.
+    """
+    global _compiled
+
+    config = settings.CKL_REST_AUTH
+    source, compiled = _compiled
+    if source is not config:
+        with _lock:
+            source, compiled = _compiled
+            if source is not config:
+                compiled = compile_settings(config)
+                _compiled = (config, compiled)
+
+    return compiled
@@ -0,0 +1,245 @@
+"""
+Password hashing offloaded to a bounded executor.
+
+Verifying or setting a password runs a slow hasher (PBKDF2 by default). When
+`CKL_REST_AUTH['HASHING']['EXECUTOR']` is set, that work is submitted to a shared thread or process
+pool instead of running inline, and at most `WORKERS + MAX_QUEUE` hashes are accepted at once per
+process. Extra requests fail fast with `HashingQueueFull` instead of queueing behind the others.
+
+`MAX_IN_FLIGHT` additionally caps how many requests that hash a password are admitted at once, so
+excess requests are shed before doing any database or hashing work.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+
+from cklauth import metrics
+
+
+class HashingQueueFull(Exception):
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+
+
+def estimate_retry_after(backlog, parallelism, timing):
+    """
+    Estimate how long, in whole seconds, it takes to drain `backlog` jobs running `parallelism`
+    at a time, based on the average duration recorded for the metrics timing `timing`.
+    """
+    average = metrics.average(timing) or 0
+    return max(1, math.ceil(backlog * average / max(parallelism, 1)))
+
+
+def _timed_call(func, *args):
+    # Runs inside the pool, so the start time tells how long the job waited in the queue.
+    # `time.monotonic` is system-wide on the supported platforms, so it is safe across processes.
+    started = time.monotonic()
+    result = func(*args)
+    return result, started, time.monotonic()
+
+
+class HashingExecutor(object):
+    def __init__(self, kind, workers, max_queue):
+        if kind == 'thread':
+            self.pool = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='cklauth-hashing'
+            )
+        elif kind == 'process':
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        else:
+            raise ImproperlyConfigured(
+                "CKL_REST_AUTH['HASHING']['EXECUTOR'] must be 'thread', 'process' or None."
+            )
+
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.slots = threading.BoundedSemaphore(self.capacity)
+
+    def run(self, func, *args):
+        """
+        Run `func(*args)` in the pool and wait for its result.
+
+        Raises:
+            HashingQueueFull: if there are already `WORKERS + MAX_QUEUE` jobs in flight.
+        """
+        if not self.slots.acquire(blocking=False):
+            metrics.incr('hashing.rejected')
+            raise HashingQueueFull(retry_after=estimate_retry_after(
+                self.capacity,
+                self.workers,
+                'hashing.hash_time'
+            ))
+
+        try:
+            submitted = time.monotonic()
+            result, started, finished = self.pool.submit(_timed_call, func, *args).result()
+        finally:
+            self.slots.release()
+
+        metrics.timing('hashing.queue_wait', started - submitted)
+        metrics.timing('hashing.hash_time', finished - started)
+        return result
+
+    async def arun(self, func, *args):
+        """
+        Same as `run`, awaiting the result instead of blocking the event loop.
+        """
+        if not self.slots.acquire(blocking=False):
+            metrics.incr('hashing.rejected')
+            raise HashingQueueFull(retry_after=estimate_retry_after(
+                self.capacity,
+                self.workers,
+                'hashing.hash_time'
+            ))
+
+        try:
+            submitted = time.monotonic()
+            future = self.pool.submit(_timed_call, func, *args)
+            result, started, finished = await asyncio.wrap_future(future)
+        finally:
+            self.slots.release()
+
+        metrics.timing('hashing.queue_wait', started - submitted)
+        metrics.timing('hashing.hash_time', finished - started)
+        return result
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+_executor_lock = threading.Lock()
+_executor = (None, None)
+
+
+def get_executor():
+    """
+    Returns the process-wide `HashingExecutor` for the current settings, or None when hashing
+    runs inline.
+    """
+    global _executor
+
+    config = settings.CKL_REST_AUTH['HASHING']
+    key = (config['EXECUTOR'], config['WORKERS'], config['MAX_QUEUE'])
+    if key[0] is None:
+        return None
+
+    current_key, executor = _executor
+    if current_key != key:
+        with _executor_lock:
+            current_key, executor = _executor
+            if current_key != key:
+                if executor is not None:
+                    executor.shutdown()
+                executor = HashingExecutor(*key)
+                _executor = (key, executor)
+
+    return executor
+
+
+class AdmissionController(object):
+    """
+    Counts the requests of this process that are doing password work and rejects new ones once
+    `CKL_REST_AUTH['HASHING']['MAX_IN_FLIGHT']` is reached.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    @contextmanager
+    def admit(self):
+        """
+        Raises:
+            HashingQueueFull: with a `retry_after` estimated from the time admitted requests take.
+        """
+        limit = settings.CKL_REST_AUTH['HASHING']['MAX_IN_FLIGHT']
+        if limit is None:
+            yield
+            return
+
+        with self.lock:
+            if self.in_flight >= limit:
+                metrics.incr('hashing.shed')
+                raise HashingQueueFull(retry_after=estimate_retry_after(
+                    self.in_flight,
+                    limit,
+                    'hashing.admitted_time'
+                ))
+            self.in_flight += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            metrics.timing('hashing.admitted_time', time.monotonic() - started)
+            with self.lock:
+                self.in_flight -= 1
+
+
+admission = AdmissionController()
+
+
+def _must_update(encoded):
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def check_password(user, raw_password):
+    """
+    Equivalent to `user.check_password(raw_password)`, using the hashing executor if enabled.
+    """
+    executor = get_executor()
+    if executor is None:
+        return user.check_password(raw_password)
+
+    encoded = user.password
+    if not executor.run(hashers.check_password, raw_password, encoded):
+        return False
+
+    # Same upgrade `AbstractBaseUser.check_password` does when the hasher settings changed
+    if _must_update(encoded):
+        user.password = executor.run(hashers.make_password, raw_password)
+        user.save(update_fields=['password'])
+
+    return True
+
+
+def make_password(raw_password):
+    """
+    Equivalent to `django.contrib.auth.hashers.make_password`, using the hashing executor if
+    enabled.
+    """
+    executor = get_executor()
+    if executor is None:
+        return hashers.make_password(raw_password)
+
+    return executor.run(hashers.make_password, raw_password)
+
+
+async def _arun(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    return await executor.arun(func, *args)
+
+
+async def amake_password(raw_password):
+    """
+    Async `make_password`: hashes in the hashing executor if enabled, or in the event loop default
+    executor, so the loop is never blocked.
+    """
+    return await _arun(hashers.make_password, raw_password)
@@ -0,0 +1,206 @@
+"""
+Local verification of Google ID tokens, with PyJWT.
+
+Google returns a signed `id_token` along with the access token. Verifying it locally (RS256
+signature, audience, issuer and expiry) gives the same user information as the userinfo endpoint
+without a second network round trip.
+
+The signing keys (JWKS) are cached in the process and in the Django cache for as long as the
+`Cache-Control` header of the keys response allows. They are refreshed in a background thread
+shortly before they expire, so requests don't wait for the refresh.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from cklauth import providers
+
+try:
+    import jwt
+except ImportError:
+    # Only used when `VERIFY_ID_TOKEN` is enabled
+    jwt = None
+
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Keys are used for this long when the response has no `Cache-Control` max-age
+DEFAULT_MAX_AGE = 3600
+# Refresh the keys in the background when they expire in less than this many seconds
+REFRESH_BEFORE = 300
+# Unknown key IDs trigger a refresh at most this often, in seconds
+MIN_REFRESH_INTERVAL = 60
+
+
+class InvalidIDToken(Exception):
+    pass
+
+
+def cache_max_age(response):
+    """
+    Returns:
+        (int) The `max-age` of the response `Cache-Control` header, or `DEFAULT_MAX_AGE`.
+    """
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+def load_keys(jwks):
+    """
+    Returns:
+        (dict) The RSA public keys of a JWKS, by key ID. Keys PyJWT can't load are skipped.
+    """
+    keys = {}
+    for jwk in jwks:
+        if jwk.get('kty') != 'RSA' or 'kid' not in jwk:
+            continue
+        try:
+            keys[jwk['kid']] = jwt.PyJWK(jwk, algorithm='RS256').key
+        except jwt.PyJWKError:
+            logger.warning('Skipping the invalid signing key %s', jwk['kid'])
+    return keys
+
+
+class JWKSCache(object):
+    """
+    Signing keys of a JWKS URL, by key ID.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.cache_key = 'cklauth:jwks:{}'.format(hashlib.md5(url.encode('utf-8')).hexdigest())
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self.keys = {}
+        self.expires = 0
+        self.fetched = 0
+
+    def fetch(self):
+        response = providers.client.get('google.jwks', self.url)
+        response.raise_for_status()
+
+        max_age = cache_max_age(response)
+        # The JWKS itself is cached, since key objects can't be pickled
+        entry = {'jwks': response.json()['keys'], 'expires': time.time() + max_age}
+        cache.set(self.cache_key, entry, max_age)
+        self.load(entry)
+
+    def load(self, entry):
+        self.keys = load_keys(entry['jwks'])
+        self.expires = entry['expires']
+        self.fetched = time.time()
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def refresh():
+            try:
+                self.fetch()
+            except Exception:
+                logger.exception('Could not refresh the keys of %s', self.url)
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def get(self, kid):
+        """
+        Returns:
+            (RSAPublicKey) The key `kid`, or None if there is no such key.
+        """
+        now = time.time()
+        if self.expires <= now:
+            entry = cache.get(self.cache_key)
+            if entry is not None:
+                self.load(entry)
+            else:
+                self.fetch()
+        elif self.expires - now < REFRESH_BEFORE:
+            self.refresh_in_background()
+
+        if kid not in self.keys and now - self.fetched >= MIN_REFRESH_INTERVAL:
+            # Keys may have been rotated before the cached ones expired
+            self.fetch()
+
+        return self.keys.get(kid)
+
+
+_jwks_lock = threading.Lock()
+_jwks = {}
+
+
+def get_jwks(url):
+    with _jwks_lock:
+        if url not in _jwks:
+            _jwks[url] = JWKSCache(url)
+        return _jwks[url]
+
+
+def verify_id_token(id_token, audience, jwks_url, issuers=GOOGLE_ISSUERS, leeway=0):
+    """
+    Verify an RS256 ID token.
+
+    Args:
+        id_token (str): the encoded token.
+        audience (str): client ID the token must have been issued to.
+        jwks_url (str): URL of the provider signing keys.
+        issuers (tuple): accepted `iss` values.
+        leeway (int): seconds of clock skew tolerated in the expiry check.
+
+    Returns:
+        (dict) The token claims.
+
+    Raises:
+        ImproperlyConfigured: if PyJWT is not installed.
+        InvalidIDToken: if the token is malformed, its signature is wrong, or it was issued by
+            someone else, to someone else, or expired.
+    """
+    if jwt is None:
+        raise ImproperlyConfigured(
+            'Verifying ID tokens requires PyJWT, `pip install cklauth[google]`.'
+        )
+
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.InvalidTokenError:
+        raise InvalidIDToken('Malformed token.')
+
+    if header.get('alg') != 'RS256':
+        raise InvalidIDToken('Unsupported algorithm.')
+
+    key = get_jwks(jwks_url).get(header.get('kid'))
+    if key is None:
+        raise InvalidIDToken('Unknown signing key.')
+
+    try:
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=['RS256'],
+            audience=audience,
+            leeway=leeway,
+            options={'require': ['exp', 'iss', 'aud']}
+        )
+    except jwt.InvalidSignatureError:
+        raise InvalidIDToken('Invalid signature.')
+    except jwt.InvalidAudienceError:
+        raise InvalidIDToken('Invalid audience.')
+    except jwt.ExpiredSignatureError:
+        raise InvalidIDToken('Token has expired.')
+    except jwt.InvalidTokenError as error:
+        raise InvalidIDToken(str(error))
+
+    if claims['iss'] not in issuers:
+        raise InvalidIDToken('Invalid issuer.')
+
+    return claims
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from cklauth.models import DeviceToken
+from cklauth.utils import keyset_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the `rest_framework.authtoken` tokens to hashed device tokens, so clients keep '
+        'their keys once `TOKEN_TYPE` is `device`. Tokens are read in primary key order and '
+        'written in small batches, and the ones already copied are skipped, so it can be run '
+        'again safely.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tokens converted per batch (default 1000).'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to wait between batches (default 0.1).'
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete the plaintext tokens once they are copied.'
+        )
+
+    def handle(self, *args, **options):
+        migrated = 0
+        batches = keyset_batches(
+            Token.objects.all(),
+            ['user_id', 'created'],
+            options['batch_size'],
+            options['sleep']
+        )
+        for batch in batches:
+            migrated += self.migrate_batch(batch)
+            if options['delete']:
+                # Goes through the model delete signals, so cached tokens are dropped as well
+                Token.objects.filter(key__in=[key for key, _, _ in batch]).delete()
+
+        self.stdout.write('Migrated {} tokens.'.format(migrated))
+
+    def migrate_batch(self, batch):
+        max_age = settings.CKL_REST_AUTH['DEVICE_TOKEN']['MAX_AGE']
+        digests = {key: DeviceToken.make_digest(key) for key, _, _ in batch}
+        existing = set(DeviceToken.objects.filter(
+            key_prefix__in={key[:DeviceToken.PREFIX_LENGTH] for key in digests}
+        ).values_list('digest', flat=True))
+
+        new_tokens = [
+            DeviceToken(
+                user_id=user_id,
+                key_prefix=key[:DeviceToken.PREFIX_LENGTH],
+                digest=digests[key],
+                # `created` is set on insert, so the original age is kept in the expiry instead
+                expires=created + timedelta(seconds=max_age) if max_age is not None else None
+            )
+            for key, user_id, created in batch
+            if digests[key] not in existing
+        ]
+        DeviceToken.objects.bulk_create(new_tokens)
+
+        return len(new_tokens)
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from cklauth.models import DeviceToken, RefreshToken, UsedRefreshToken
+from cklauth.utils import keyset_batches
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired tokens, tokens of inactive or missing users, expired device tokens, '
+        'expired or revoked refresh tokens and expired used refresh tokens. Rows are scanned in '
+        'primary key order and deleted in small batches, so it can run on a live database without '
+        'holding long locks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows scanned per batch (default 1000).'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to wait between batches (default 0.1).'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.sleep = options['sleep']
+
+        deleted = self.purge_tokens()
+        self.stdout.write('Deleted {} tokens.'.format(deleted))
+
+        deleted = self.purge_device_tokens()
+        self.stdout.write('Deleted {} device tokens.'.format(deleted))
+
+        deleted = self.purge_refresh_tokens()
+        self.stdout.write('Deleted {} refresh tokens.'.format(deleted))
+
+        deleted = self.purge_used_refresh_tokens()
+        self.stdout.write('Deleted {} used refresh tokens.'.format(deleted))
+
+    def batches(self, queryset, fields):
+        return keyset_batches(queryset, fields, self.batch_size, self.sleep)
+
+    def purge_tokens(self):
+        ttl = settings.CKL_REST_AUTH['TOKEN_TTL']
+        expired_before = timezone.now() - timedelta(seconds=ttl) if ttl is not None else None
+
+        active_users = User.objects.all()
+        try:
+            User._meta.get_field('is_active')
+            active_users = active_users.filter(is_active=True)
+        except FieldDoesNotExist:
+            pass
+
+        deleted = 0
+        for batch in self.batches(Token.objects.all(), ['created', 'user_id']):
+            user_ids = active_users.filter(
+                pk__in={user_id for _, _, user_id in batch}
+            ).values_list('pk', flat=True)
+            active_user_ids = set(user_ids)
+
+            stale_keys = [
+                key
+                for key, created, user_id in batch
+                if user_id not in active_user_ids or (
+                    expired_before is not None and created <= expired_before
+                )
+            ]
+            if stale_keys:
+                # Goes through the model delete signals, so cached tokens are dropped as well
+                Token.objects.filter(key__in=stale_keys).delete()
+                deleted += len(stale_keys)
+
+        return deleted
+
+    def purge_device_tokens(self):
+        expired = DeviceToken.objects.filter(expires__lte=timezone.now())
+
+        deleted = 0
+        for batch in self.batches(expired, []):
+            deleted += DeviceToken.objects.filter(pk__in=[pk for pk, in batch]).delete()[0]
+
+        return deleted
+
+    def purge_refresh_tokens(self):
+        stale = Q(expires__lte=timezone.now()) | Q(revoked=True)
+
+        deleted = 0
+        for batch in self.batches(RefreshToken.objects.filter(stale), []):
+            deleted += RefreshToken.objects.filter(pk__in=[pk for pk, in batch]).delete()[0]
+
+        return deleted
+
+    def purge_used_refresh_tokens(self):
+        expired = UsedRefreshToken.objects.filter(expires__lte=timezone.now())
+
+        deleted = 0
+        for batch in self.batches(expired, []):
+            deleted += UsedRefreshToken.objects.filter(pk__in=[pk for pk, in batch]).delete()[0]
+
+        return deleted
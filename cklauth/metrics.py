@@ -0,0 +1,64 @@
+"""
+In-process counters and timings for cklauth internals.
+
+Values are kept per process, so each worker reports its own numbers. Use `snapshot()` to export
+them to your monitoring system.
+"""
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+
+
+def incr(name, value=1):
+    """
+    Increment the counter `name` by `value`.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def timing(name, seconds):
+    """
+    Record a duration, in seconds, for the timing `name`.
+    """
+    with _lock:
+        count, total, maximum = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + seconds, max(maximum, seconds))
+
+
+def average(name):
+    """
+    Returns the average duration recorded for the timing `name`, or None if there is none.
+    """
+    count, total, _ = _timings.get(name, (0, 0.0, 0.0))
+    return total / count if count else None
+
+
+def snapshot():
+    """
+    Returns:
+        (dict) Current `counters` and `timings` (count, total, max and avg in seconds).
+    """
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'timings': {
+                name: {
+                    'count': count,
+                    'total': total,
+                    'max': maximum,
+                    'avg': total / count,
+                }
+                for name, (count, total, maximum) in _timings.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
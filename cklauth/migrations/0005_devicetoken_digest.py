@@ -0,0 +1,54 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def hash_keys(apps, schema_editor):
+    DeviceToken = apps.get_model('cklauth', 'DeviceToken')
+    hash_key = (
+        getattr(settings, 'CKL_REST_AUTH', {}).get('DEVICE_TOKEN', {}).get('HASH_KEY')
+        or settings.SECRET_KEY
+    )
+
+    last_pk = 0
+    while True:
+        batch = list(
+            DeviceToken.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'key')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for token in batch:
+            token.digest = hmac.new(
+                hash_key.encode('utf-8'),
+                token.key.encode('utf-8'),
+                hashlib.sha256
+            ).hexdigest()
+        DeviceToken.objects.bulk_update(batch, ['digest'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cklauth', '0004_devicetoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='digest',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_keys, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='devicetoken',
+            name='key',
+        ),
+    ]
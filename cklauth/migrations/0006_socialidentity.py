@@ -0,0 +1,92 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+PROVIDER_FIELDS = (('google', 'google_id'), ('facebook', 'facebook_id'))
+
+
+def copy_social_accounts(apps, schema_editor):
+    SocialAccount = apps.get_model('cklauth', 'SocialAccount')
+    SocialIdentity = apps.get_model('cklauth', 'SocialIdentity')
+
+    # Accounts had no unique index on the provider ids, so the same id may belong to several
+    # users. Copied in user order, the oldest user keeps it and the duplicates are skipped.
+    last_user_id = None
+    while True:
+        accounts = SocialAccount.objects.order_by('user_id')
+        if last_user_id is not None:
+            accounts = accounts.filter(user_id__gt=last_user_id)
+        batch = list(accounts.values_list(
+            'user_id', *[field for _, field in PROVIDER_FIELDS]
+        )[:BATCH_SIZE])
+        if not batch:
+            break
+
+        SocialIdentity.objects.bulk_create([
+            SocialIdentity(user_id=row[0], provider=provider, uid=uid)
+            for row in batch
+            for (provider, _), uid in zip(PROVIDER_FIELDS, row[1:])
+            if uid
+        ], ignore_conflicts=True)
+        last_user_id = batch[-1][0]
+
+
+def copy_social_identities(apps, schema_editor):
+    SocialAccount = apps.get_model('cklauth', 'SocialAccount')
+    SocialIdentity = apps.get_model('cklauth', 'SocialIdentity')
+    fields = dict(PROVIDER_FIELDS)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            SocialIdentity.objects.filter(
+                pk__gt=last_pk,
+                provider__in=fields
+            ).order_by('pk').values_list('pk', 'user_id', 'provider', 'uid')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for _, user_id, provider, uid in batch:
+            SocialAccount.objects.update_or_create(
+                user_id=user_id,
+                defaults={fields[provider]: uid}
+            )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cklauth', '0005_devicetoken_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SocialIdentity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=30)),
+                ('uid', models.CharField(max_length=100)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='social_identities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'social identities',
+            },
+        ),
+        # Created before copying, unlike the deferred index of CreateModel, to skip duplicates
+        migrations.AlterUniqueTogether(
+            name='socialidentity',
+            unique_together={('provider', 'uid')},
+        ),
+        migrations.RunPython(copy_social_accounts, copy_social_identities),
+        migrations.DeleteModel(
+            name='SocialAccount',
+        ),
+    ]
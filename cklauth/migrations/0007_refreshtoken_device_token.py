@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cklauth', '0006_socialidentity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='device_token',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='refresh_tokens', to='cklauth.DeviceToken'),
+        ),
+    ]
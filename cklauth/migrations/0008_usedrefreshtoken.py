@@ -0,0 +1,55 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def copy_previous_hashes(apps, schema_editor):
+    RefreshToken = apps.get_model('cklauth', 'RefreshToken')
+    UsedRefreshToken = apps.get_model('cklauth', 'UsedRefreshToken')
+
+    last_pk = 0
+    while True:
+        batch = list(
+            RefreshToken.objects.filter(
+                pk__gt=last_pk,
+                previous_hash__isnull=False
+            ).order_by('pk').values_list('pk', 'user_id', 'previous_hash', 'expires')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        UsedRefreshToken.objects.bulk_create([
+            UsedRefreshToken(user_id=user_id, token_hash=previous_hash, expires=expires)
+            for _, user_id, previous_hash, expires in batch
+        ])
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cklauth', '0007_refreshtoken_device_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsedRefreshToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('expires', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='used_refresh_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_previous_hashes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='refreshtoken',
+            name='previous_hash',
+        ),
+    ]
@@ -1,12 +1,110 @@
+import hashlib
+import hmac
+
 from django.db import models
 from django.contrib.auth import settings
+from rest_framework.authtoken.models import Token
+
+
+class SocialIdentity(models.Model):
+    """
+    An account of a social provider (`google`, `facebook`...) the user logs in with. Users may
+    have one per provider, looked up by the unique (`provider`, `uid`) index.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='social_identities',
+        on_delete=models.CASCADE
+    )
+    provider = models.CharField(max_length=30)
+    uid = models.CharField(max_length=100)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('provider', 'uid'), )
+        verbose_name_plural = 'social identities'
 
 
-class SocialAccount(models.Model):
-    user = models.OneToOneField(
+class RefreshToken(models.Model):
+    """
+    A refresh token family. Each refresh rotates `token_hash` in place and records the replaced
+    hash as a `UsedRefreshToken`.
+
+    With device tokens, the family is linked to the device token it refreshes, which each refresh
+    replaces. Revoking the device token deletes the family.
+    """
+    user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        related_name='social_account',
+        related_name='refresh_tokens',
+        on_delete=models.CASCADE
+    )
+    device_token = models.ForeignKey(
+        'DeviceToken',
+        null=True,
+        blank=True,
+        related_name='refresh_tokens',
         on_delete=models.CASCADE
     )
-    facebook_id = models.CharField(max_length=100, null=True, blank=True)
-    google_id = models.CharField(max_length=100, null=True, blank=True)
+    token_hash = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(null=True, blank=True)
+    expires = models.DateTimeField()
+    revoked = models.BooleanField(default=False)
+
+
+class UsedRefreshToken(models.Model):
+    """
+    The hash of a refresh token that was already rotated, kept until the token would have expired
+    so replaying any earlier token of a family (possibly stolen) is detected.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='used_refresh_tokens',
+        on_delete=models.CASCADE
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires = models.DateTimeField()
+
+
+class TokenActivity(models.Model):
+    """
+    When a `rest_framework.authtoken` token was last used, written by `cklauth.usage`.
+    """
+    token = models.OneToOneField(
+        Token,
+        primary_key=True,
+        related_name='activity',
+        on_delete=models.CASCADE
+    )
+    last_used = models.DateTimeField()
+
+
+class DeviceToken(models.Model):
+    """
+    An authentication token of one of the user devices.
+
+    The key itself is not stored, only its first characters in the indexed `key_prefix` and an
+    HMAC-SHA256 `digest` of it. Tokens are looked up by prefix and their digests compared in
+    constant time.
+    """
+    PREFIX_LENGTH = 8
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='device_tokens',
+        on_delete=models.CASCADE
+    )
+    key_prefix = models.CharField(max_length=PREFIX_LENGTH, db_index=True)
+    digest = models.CharField(max_length=64)
+    device = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def make_digest(key):
+        hash_key = settings.CKL_REST_AUTH['DEVICE_TOKEN']['HASH_KEY'] or settings.SECRET_KEY
+        return hmac.new(
+            hash_key.encode('utf-8'),
+            key.encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
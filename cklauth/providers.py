@@ -0,0 +1,347 @@
+"""
+HTTP client for the calls to the social providers (Google and Facebook).
+
+All calls of a process share one `requests.Session`, so connections to the providers are pooled
+and kept alive between logins instead of paying the DNS, TCP and TLS handshakes every time.
+Calls have connect and read timeouts, and idempotent ones (GET) are retried with backoff on
+connection errors and 502, 503 and 504 responses, per `CKL_REST_AUTH['PROVIDER_HTTP']`.
+
+With `CKL_REST_AUTH['CIRCUIT_BREAKER']['ENABLED']`, each provider also has a circuit breaker whose
+state lives in the Django cache, so all workers share it. When too many calls to a provider fail
+or are too slow, further calls fail fast with `CircuitOpen` for a while, then a single probe call
+decides whether the provider recovered.
+"""
+import asyncio
+import math
+import threading
+import time
+import weakref
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cklauth import metrics
+
+try:
+    import httpx
+except ImportError:
+    # Only used by the async views
+    httpx = None
+
+# Errors of the async provider calls
+ASYNC_HTTP_ERRORS = (httpx.HTTPError, ) if httpx is not None else ()
+
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, provider, retry_after=None):
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def _cache_incr(key, timeout):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+class CircuitBreaker(object):
+    """
+    Failure-rate circuit breaker of a provider, shared across processes through the Django cache.
+
+    Calls are counted in fixed windows of `WINDOW` seconds. Once a window has at least
+    `MIN_CALLS` calls and `FAILURE_RATE` of them failed (connection errors, 5xx responses or calls
+    slower than `SLOW_CALL_DURATION`), the circuit opens for `OPEN_TIMEOUT` seconds. It is then
+    half-open: one probe call goes through and closes it again on success or reopens it on failure.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def key(self, name):
+        return 'cklauth:circuit:{}:{}'.format(self.provider, name)
+
+    def window_keys(self, config):
+        window = int(time.time() // config['WINDOW'])
+        return self.key('calls:{}'.format(window)), self.key('failures:{}'.format(window))
+
+    def before_call(self):
+        """
+        Returns:
+            (bool) Whether the call is the probe of a half-open circuit.
+
+        Raises:
+            CircuitOpen: if calls to the provider must fail fast.
+        """
+        config = settings.CKL_REST_AUTH['CIRCUIT_BREAKER']
+        opened = cache.get(self.key('open'))
+        if opened is not None:
+            metrics.incr('providers.{}.circuit.rejected'.format(self.provider))
+            raise CircuitOpen(
+                self.provider,
+                retry_after=max(1, math.ceil(opened + config['OPEN_TIMEOUT'] - time.time()))
+            )
+
+        if cache.get(self.key('tripped')) is None:
+            return False
+
+        if not cache.add(self.key('probe'), 1, config['OPEN_TIMEOUT']):
+            metrics.incr('providers.{}.circuit.rejected'.format(self.provider))
+            raise CircuitOpen(self.provider, retry_after=1)
+        return True
+
+    def record(self, failed, probe=False):
+        config = settings.CKL_REST_AUTH['CIRCUIT_BREAKER']
+        if probe:
+            if failed:
+                self.open(config)
+            else:
+                cache.delete_many([self.key('tripped'), *self.window_keys(config)])
+            cache.delete(self.key('probe'))
+            return
+
+        calls_key, failures_key = self.window_keys(config)
+        calls = _cache_incr(calls_key, config['WINDOW'])
+        if not failed:
+            return
+
+        failures = _cache_incr(failures_key, config['WINDOW'])
+        if calls >= config['MIN_CALLS'] and failures >= calls * config['FAILURE_RATE']:
+            self.open(config)
+
+    def open(self, config):
+        metrics.incr('providers.{}.circuit.opened'.format(self.provider))
+        cache.set(self.key('tripped'), True, None)
+        cache.set(self.key('open'), time.time(), config['OPEN_TIMEOUT'])
+
+    def state(self):
+        """
+        Returns:
+            (dict) `state` of the circuit (`closed`, `open` or `half_open`) and the `calls` and
+            `failures` of the current window, for monitoring.
+        """
+        config = settings.CKL_REST_AUTH['CIRCUIT_BREAKER']
+        calls_key, failures_key = self.window_keys(config)
+        values = cache.get_many([
+            self.key('open'), self.key('tripped'), calls_key, failures_key
+        ])
+
+        if self.key('open') in values:
+            state = 'open'
+        elif self.key('tripped') in values:
+            state = 'half_open'
+        else:
+            state = 'closed'
+
+        return {
+            'state': state,
+            'calls': values.get(calls_key, 0),
+            'failures': values.get(failures_key, 0),
+        }
+
+
+class ProviderClient(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = (None, None)
+        self.breakers = {}
+
+    def get_session(self):
+        """
+        Returns the process-wide session for the current settings.
+        """
+        config = settings.CKL_REST_AUTH['PROVIDER_HTTP']
+        key = (config['RETRIES'], config['BACKOFF_FACTOR'], config['POOL_SIZE'])
+
+        current_key, session = self.session
+        if current_key != key:
+            with self.lock:
+                current_key, session = self.session
+                if current_key != key:
+                    if session is not None:
+                        session.close()
+                    session = self.make_session(*key)
+                    self.session = (key, session)
+
+        return session
+
+    def make_session(self, retries, backoff_factor, pool_size):
+        # urllib3 only retries idempotent methods by default, so POSTs are never repeated
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUSES,
+                raise_on_status=False
+            )
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_breaker(self, provider):
+        """
+        Returns the `CircuitBreaker` of `provider`, or None if circuit breakers are disabled.
+        """
+        if not settings.CKL_REST_AUTH['CIRCUIT_BREAKER']['ENABLED']:
+            return None
+
+        with self.lock:
+            if provider not in self.breakers:
+                self.breakers[provider] = CircuitBreaker(provider)
+            return self.breakers[provider]
+
+    def request(self, name, method, url, **kwargs):
+        """
+        Make a request to a provider, recording its duration in the `providers.<name>` timing.
+
+        Args:
+            name (str): name of the provider endpoint, e.g. `google.user_info`.
+            method (str): `get` or `post`.
+            url (str): endpoint URL.
+            kwargs: passed to `requests.Session.request`.
+
+        Raises:
+            CircuitOpen: if the circuit breaker of the provider is open.
+            RequestException: if the provider can't be reached or is too slow to respond.
+        """
+        config = settings.CKL_REST_AUTH['PROVIDER_HTTP']
+        kwargs.setdefault('timeout', (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT']))
+
+        breaker = self.get_breaker(name.split('.')[0])
+        probe = breaker.before_call() if breaker is not None else False
+
+        failed = True
+        started = time.monotonic()
+        try:
+            response = getattr(self.get_session(), method)(url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        except requests.RequestException:
+            metrics.incr('providers.{}.errors'.format(name))
+            raise
+        finally:
+            self.record(name, breaker, probe, failed, time.monotonic() - started)
+
+    def record(self, name, breaker, probe, failed, duration):
+        """
+        Record the duration of a call and its outcome in the provider circuit breaker.
+        """
+        metrics.timing('providers.{}'.format(name), duration)
+        if breaker is not None:
+            slow = duration > settings.CKL_REST_AUTH['CIRCUIT_BREAKER']['SLOW_CALL_DURATION']
+            breaker.record(failed or slow, probe)
+
+    def get(self, name, url, **kwargs):
+        return self.request(name, 'get', url, **kwargs)
+
+    def post(self, name, url, **kwargs):
+        return self.request(name, 'post', url, **kwargs)
+
+
+client = ProviderClient()
+
+
+class AsyncProviderClient(object):
+    """
+    `ProviderClient` counterpart for the async views, on `httpx`. Each event loop gets its own
+    pooled, keep-alive `httpx.AsyncClient`. Failed connections are retried, responses aren't.
+    """
+
+    def __init__(self):
+        self.clients = weakref.WeakKeyDictionary()
+
+    def get_client(self):
+        if httpx is None:
+            raise ImproperlyConfigured('The async views require httpx, `pip install httpx`.')
+
+        config = settings.CKL_REST_AUTH['PROVIDER_HTTP']
+        key = (config['RETRIES'], config['POOL_SIZE'])
+        loop = asyncio.get_running_loop()
+
+        current_key, http_client = self.clients.get(loop, (None, None))
+        if current_key != key:
+            if http_client is not None:
+                loop.create_task(http_client.aclose())
+            http_client = httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(
+                retries=config['RETRIES'],
+                limits=httpx.Limits(max_keepalive_connections=config['POOL_SIZE'])
+            ))
+            self.clients[loop] = (key, http_client)
+
+        return http_client
+
+    async def request(self, name, method, url, **kwargs):
+        """
+        Same as `ProviderClient.request`, without blocking the event loop.
+
+        Raises:
+            CircuitOpen: if the circuit breaker of the provider is open.
+            HTTPError: if the provider can't be reached or is too slow to respond.
+        """
+        # Raises ImproperlyConfigured first when httpx isn't installed
+        http_client = self.get_client()
+
+        config = settings.CKL_REST_AUTH['PROVIDER_HTTP']
+        kwargs.setdefault('timeout', httpx.Timeout(
+            config['READ_TIMEOUT'],
+            connect=config['CONNECT_TIMEOUT']
+        ))
+
+        # The breaker state is in the Django cache, so it's read and written in the default
+        # executor instead of on the event loop
+        loop = asyncio.get_running_loop()
+        breaker = client.get_breaker(name.split('.')[0])
+        probe = False
+        if breaker is not None:
+            probe = await loop.run_in_executor(None, breaker.before_call)
+
+        failed = True
+        started = time.monotonic()
+        try:
+            response = await http_client.request(method.upper(), url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        except httpx.HTTPError:
+            metrics.incr('providers.{}.errors'.format(name))
+            raise
+        finally:
+            duration = time.monotonic() - started
+            if breaker is not None:
+                await loop.run_in_executor(
+                    None,
+                    client.record,
+                    name,
+                    breaker,
+                    probe,
+                    failed,
+                    duration
+                )
+            else:
+                client.record(name, breaker, probe, failed, duration)
+
+
+async_client = AsyncProviderClient()
+
+
+def circuit_states():
+    """
+    Returns:
+        (dict) Circuit breaker state of each provider called by this process, by provider name.
+    """
+    return {
+        provider: breaker.state()
+        for provider, breaker in list(client.breakers.items())
+    }
@@ -0,0 +1,134 @@
+"""
+Sliding-window rate limiting backed by the Django cache.
+
+Each limit keeps a counter per fixed window, and a request is weighed against the current window
+counter plus the previous one, scaled by how much of the previous window still overlaps the last
+`<period>`. Unlike a plain fixed window, this doesn't allow twice the rate across a window
+boundary. A check costs one `get_many` for all the limits, then one `incr` per limit when the
+request is allowed, so it is cheap enough to run before any password hashing. Rates use the same
+`<number>/<period>` format as DRF throttles, e.g. `5/min`.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from cklauth import metrics
+
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Returns:
+        (tuple) Number of allowed requests and the window duration in seconds.
+    """
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+def window_keys(key, duration, now):
+    """
+    Returns:
+        (tuple) Cache keys of the current and the previous window counters of `key`.
+    """
+    window = int(now // duration)
+    return (
+        'cklauth:ratelimit:{}:{}'.format(key, window),
+        'cklauth:ratelimit:{}:{}'.format(key, window - 1),
+    )
+
+
+def weighted_count(current, previous, elapsed, duration):
+    """
+    Estimate the requests made in the last `duration` seconds, assuming the previous window
+    requests were evenly spread.
+    """
+    return current + previous * (duration - elapsed) / duration
+
+
+def retry_after(num, current, previous, elapsed, duration):
+    """
+    Returns:
+        (float) Seconds until one more request fits in the sliding window.
+    """
+    if current + 1 > num or not previous:
+        # Only the current window counter can let it through, once it becomes the previous one
+        return duration - elapsed + duration * (1 - (num - 1) / max(current, 1))
+    return max(duration * (1 - (num - 1 - current) / previous) - elapsed, 0)
+
+
+def increment(cache_key, exists, timeout):
+    if not exists and cache.add(cache_key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(cache_key)
+    except ValueError:
+        # Expired meanwhile
+        cache.add(cache_key, 0, timeout)
+        return cache.incr(cache_key)
+
+
+def hit_all(limits):
+    """
+    Count a request against each `(key, rate)` of `limits`. Requests are only counted when all
+    the limits allow them.
+
+    Raises:
+        Throttled: if any key already made all the requests its rate allows in the last period.
+    """
+    now = time.time()
+    windows = []
+    for key, rate in limits:
+        num, duration = parse_rate(rate)
+        windows.append((num, duration, now % duration) + window_keys(key, duration, now))
+
+    counts = cache.get_many([
+        cache_key for *_, current_key, previous_key in windows
+        for cache_key in (current_key, previous_key)
+    ])
+
+    for num, duration, elapsed, current_key, previous_key in windows:
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+        if weighted_count(current + 1, previous, elapsed, duration) > num:
+            raise Throttled(wait=retry_after(num, current, previous, elapsed, duration))
+
+    for num, duration, elapsed, current_key, previous_key in windows:
+        # Counters are read again by the next window as its previous one
+        current = increment(current_key, current_key in counts, duration * 2)
+        previous = counts.get(previous_key, 0)
+        # Concurrent requests may have filled the window since it was read
+        if weighted_count(current, previous, elapsed, duration) > num:
+            raise Throttled(wait=retry_after(num, current - 1, previous, elapsed, duration))
+
+
+def check(request, scope, identifier):
+    """
+    Apply the `CKL_REST_AUTH['RATE_LIMIT']` rates to `identifier` (the login field value, for
+    instance) and to the client IP address.
+
+    Raises:
+        Throttled: if any of the limits was exceeded.
+    """
+    config = settings.CKL_REST_AUTH['RATE_LIMIT']
+    limits = []
+    if config['IDENTIFIER_RATE']:
+        digest = hashlib.md5(str(identifier).lower().encode('utf-8')).hexdigest()
+        limits.append(('{}:identifier:{}'.format(scope, digest), config['IDENTIFIER_RATE']))
+    if config['IP_RATE']:
+        ident = BaseThrottle().get_ident(request)
+        limits.append(('{}:ip:{}'.format(scope, ident), config['IP_RATE']))
+
+    if not limits:
+        return
+
+    try:
+        hit_all(limits)
+    except Throttled:
+        metrics.incr('ratelimit.{}.rejected'.format(scope))
+        raise
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from cklauth import auth, tokens
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    auth.invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_token_cache(sender, instance, **kwargs):
+    auth.invalidate_user_token(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def revoke_inactive_user_tokens(sender, instance, **kwargs):
+    if not instance.is_active:
+        tokens.revoke_signed_tokens(instance.pk)
+        tokens.revoke_refresh_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    tokens.revoke_signed_tokens(instance.pk)
@@ -0,0 +1,294 @@
+"""
+Tokens returned by the login, register and social views.
+
+With `CKL_REST_AUTH['TOKEN_TYPE'] = 'database'` (default) the views return the user's
+`rest_framework.authtoken` token. With `'signed'` they return short-lived tokens signed with
+HMAC, verified by `cklauth.auth.SignedTokenAuthentication` without querying the database. With
+`'device'` each login gets its own `cklauth.models.DeviceToken`, which can be revoked separately.
+
+With `CKL_REST_AUTH['REFRESH_TOKEN']['ENABLED']`, the views also return a refresh token that can
+be exchanged for a new token (and a new refresh token) in the refresh endpoint.
+"""
+import hashlib
+from binascii import hexlify
+from datetime import timedelta
+from os import urandom
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from cklauth.models import DeviceToken, RefreshToken, UsedRefreshToken
+
+
+User = get_user_model()
+
+
+class SignedToken(object):
+    def __init__(self, key, user_id):
+        self.key = key
+        self.user_id = user_id
+
+
+def revocation_cache_key(user_pk):
+    return 'cklauth:token-revocation:{}'.format(user_pk)
+
+
+def signing_keys():
+    """
+    Returns:
+        (list) Keys that signed tokens are verified with, new tokens are signed with the first.
+    """
+    return settings.CKL_REST_AUTH['SIGNED_TOKEN']['KEYS'] or [settings.SECRET_KEY]
+
+
+def sign_token(user):
+    config = settings.CKL_REST_AUTH['SIGNED_TOKEN']
+    payload = {
+        'u': str(user.pk),
+        'v': cache.get(revocation_cache_key(user.pk), 0),
+    }
+    key = signing.dumps(payload, key=signing_keys()[0], salt=config['SALT'])
+
+    return SignedToken(key, user.pk)
+
+
+def verify_signed_token(key):
+    """
+    Check the signature, age and revocation counter of a signed token.
+
+    Returns:
+        (str) The primary key of the token user.
+
+    Raises:
+        AuthenticationFailed: if the token is not valid.
+    """
+    config = settings.CKL_REST_AUTH['SIGNED_TOKEN']
+    for signing_key in signing_keys():
+        try:
+            payload = signing.loads(
+                key,
+                key=signing_key,
+                salt=config['SALT'],
+                max_age=config['MAX_AGE']
+            )
+            break
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except signing.BadSignature:
+            continue
+    else:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+
+    if payload['v'] < cache.get(revocation_cache_key(payload['u']), 0):
+        raise exceptions.AuthenticationFailed('Token has been revoked.')
+
+    return payload['u']
+
+
+def revoke_signed_tokens(user_pk):
+    """
+    Invalidate all signed tokens issued to the user so far.
+    """
+    key = revocation_cache_key(user_pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def issue_device_token(user, device=''):
+    key = hexlify(urandom(20)).decode()
+    max_age = settings.CKL_REST_AUTH['DEVICE_TOKEN']['MAX_AGE']
+    token = DeviceToken.objects.create(
+        user=user,
+        key_prefix=key[:DeviceToken.PREFIX_LENGTH],
+        digest=DeviceToken.make_digest(key),
+        device=device[:DeviceToken._meta.get_field('device').max_length],
+        expires=timezone.now() + timedelta(seconds=max_age) if max_age is not None else None
+    )
+    # Only returned to the client, it isn't stored
+    token.key = key
+
+    return token
+
+
+def revoke_all_tokens(user_pk):
+    """
+    Log the user out of every device: delete its `rest_framework.authtoken` token and its device
+    tokens, revoke its refresh tokens and invalidate its signed tokens.
+    """
+    # Deleted through the model so the token cache is invalidated by the post_delete signal
+    Token.objects.filter(user_id=user_pk).delete()
+    DeviceToken.objects.filter(user_id=user_pk).delete()
+    revoke_refresh_tokens(user_pk)
+    revoke_signed_tokens(user_pk)
+
+
+def issue_token(user, created=False, device=''):
+    """
+    Returns the token for an authenticated user, according to `CKL_REST_AUTH['TOKEN_TYPE']`.
+    All token types have the token string in `key`.
+
+    Args:
+        user (User): the authenticated user.
+        created (bool): whether the user was just created, so it can't have a token yet.
+        device (str): label of the device the user logged in from, for device tokens.
+    """
+    if settings.CKL_REST_AUTH['TOKEN_TYPE'] == 'signed':
+        return sign_token(user)
+
+    if settings.CKL_REST_AUTH['TOKEN_TYPE'] == 'device':
+        return issue_device_token(user, device)
+
+    if created:
+        return Token.objects.create(user=user)
+
+    try:
+        # Already loaded when the user was fetched with `select_related('auth_token')`
+        token = user.auth_token
+    except Token.DoesNotExist:
+        token, created = Token.objects.get_or_create(user=user)
+
+    if not created and token_expired(token):
+        token.delete()
+        token = Token.objects.create(user=user)
+
+    return token
+
+
+def token_expired(token):
+    """
+    Whether a `rest_framework.authtoken` token is older than `CKL_REST_AUTH['TOKEN_TTL']`.
+    """
+    ttl = settings.CKL_REST_AUTH['TOKEN_TTL']
+    return ttl is not None and token.created <= timezone.now() - timedelta(seconds=ttl)
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def refresh_token_hash(secret):
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(user, device_token=None):
+    """
+    Start a new refresh token family for the user.
+
+    Args:
+        user (User): the authenticated user.
+        device_token (DeviceToken): the device token issued with the refresh token, if any.
+
+    Returns:
+        (str) The refresh token, in the `<user pk>.<secret>` format. Only the secret hash is
+        stored.
+    """
+    secret = hexlify(urandom(20)).decode()
+    RefreshToken.objects.create(
+        user=user,
+        device_token=device_token,
+        token_hash=refresh_token_hash(secret),
+        expires=timezone.now() + timedelta(
+            seconds=settings.CKL_REST_AUTH['REFRESH_TOKEN']['MAX_AGE']
+        )
+    )
+
+    return '{}.{}'.format(user.pk, secret)
+
+
+def rotate_refresh_token(refresh_token):
+    """
+    Replace a refresh token with a new one of the same family, in a single indexed UPDATE, and
+    record the replaced hash.
+
+    Presenting any token that was already replaced revokes the refresh tokens of the user, as
+    well as its signed tokens, since the token was probably stolen.
+
+    Returns:
+        (tuple) The token user, with only its primary key loaded, and the new refresh token.
+
+    Raises:
+        InvalidRefreshToken: if the token is unknown, expired, revoked or was already used.
+    """
+    user_pk, _, secret = refresh_token.rpartition('.')
+    try:
+        user_pk = User._meta.pk.to_python(user_pk)
+    except ValidationError:
+        raise InvalidRefreshToken()
+
+    if not user_pk or not secret:
+        raise InvalidRefreshToken()
+
+    token_hash = refresh_token_hash(secret)
+    new_secret = hexlify(urandom(20)).decode()
+    now = timezone.now()
+
+    with transaction.atomic():
+        rotated = RefreshToken.objects.filter(
+            user_id=user_pk,
+            token_hash=token_hash,
+            revoked=False,
+            expires__gt=now
+        ).update(
+            token_hash=refresh_token_hash(new_secret),
+            last_used=now
+        )
+        if rotated:
+            # The family was issued before now, so it expires by then at the latest
+            max_age = settings.CKL_REST_AUTH['REFRESH_TOKEN']['MAX_AGE']
+            UsedRefreshToken.objects.create(
+                user_id=user_pk,
+                token_hash=token_hash,
+                expires=now + timedelta(seconds=max_age)
+            )
+
+    if not rotated:
+        if UsedRefreshToken.objects.filter(user_id=user_pk, token_hash=token_hash).exists():
+            revoke_refresh_tokens(user_pk)
+            revoke_signed_tokens(user_pk)
+        raise InvalidRefreshToken()
+
+    user = User.from_db(router.db_for_read(User), [User._meta.pk.attname], [user_pk])
+    return user, '{}.{}'.format(user_pk, new_secret)
+
+
+def issue_refreshed_token(user, refresh_token):
+    """
+    Returns the token for a user that just rotated its refresh token into `refresh_token`.
+
+    With device tokens, it replaces the device token of the refresh token family, keeping its
+    device label, so refreshing doesn't pile up device tokens.
+
+    Raises:
+        InvalidRefreshToken: if the device token was revoked meanwhile.
+    """
+    if settings.CKL_REST_AUTH['TOKEN_TYPE'] != 'device':
+        return issue_token(user)
+
+    family = RefreshToken.objects.select_related('device_token').get(
+        token_hash=refresh_token_hash(refresh_token.rpartition('.')[2])
+    )
+    previous = family.device_token
+
+    with transaction.atomic():
+        token = issue_device_token(user, previous.device if previous is not None else '')
+        if not RefreshToken.objects.filter(pk=family.pk).update(device_token=token):
+            # The device token and its family were revoked after the rotation
+            raise InvalidRefreshToken()
+        if previous is not None:
+            DeviceToken.objects.filter(pk=previous.pk).delete()
+
+    return token
+
+
+def revoke_refresh_tokens(user_pk):
+    RefreshToken.objects.filter(user_id=user_pk, revoked=False).update(revoked=True)
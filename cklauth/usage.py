@@ -0,0 +1,110 @@
+"""
+Write-coalesced tracking of when tokens were last used.
+
+Authentication classes record touches in memory. At most once per
+`CKL_REST_AUTH['USAGE_TRACKING']['FLUSH_INTERVAL']` seconds, the next touch flushes everything
+recorded by the process with a few batched `UPDATE ... CASE` statements, so tokens and users get
+at most one write per interval instead of one per request.
+
+Touches live in the process memory, so `tracker.flush()` is also registered to run when the
+process exits. Call it from server hooks that end workers without a normal interpreter exit.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from cklauth.models import TokenActivity
+
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def case_update(queryset, field, values):
+    """
+    Set `field` of each `queryset` row to `values[row pk]`, in a single UPDATE.
+    """
+    return queryset.filter(pk__in=values).update(**{field: Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        output_field=DateTimeField()
+    )})
+
+
+class UsageTracker(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.users = {}
+        self.flushed_at = time.monotonic()
+
+    def touch(self, user, token=None):
+        """
+        Record that `user` authenticated, with `token` if it is a `rest_framework.authtoken`
+        token, flushing the recorded touches if the flush interval elapsed.
+        """
+        now = timezone.now()
+        with self.lock:
+            self.users[user.pk] = now
+            if isinstance(token, Token):
+                self.tokens[token.key] = now
+
+            interval = settings.CKL_REST_AUTH['USAGE_TRACKING']['FLUSH_INTERVAL']
+            if time.monotonic() - self.flushed_at < interval:
+                return
+
+        self.flush()
+
+    def flush(self):
+        """
+        Write the recorded touches to the database.
+        """
+        with self.lock:
+            tokens, self.tokens = self.tokens, {}
+            users, self.users = self.users, {}
+            self.flushed_at = time.monotonic()
+
+        try:
+            if tokens:
+                self.flush_tokens(tokens)
+            if users:
+                case_update(User.objects.all(), 'last_login', users)
+        except DatabaseError:
+            logger.exception('Could not flush token usage.')
+
+    def flush_tokens(self, tokens):
+        existing = set(
+            TokenActivity.objects.filter(pk__in=tokens).values_list('pk', flat=True)
+        )
+        if existing:
+            case_update(
+                TokenActivity.objects.all(),
+                'last_used',
+                {key: tokens[key] for key in existing}
+            )
+
+        missing = Token.objects.filter(
+            key__in=set(tokens) - existing
+        ).values_list('key', flat=True)
+        if missing:
+            try:
+                with transaction.atomic():
+                    TokenActivity.objects.bulk_create([
+                        TokenActivity(token_id=key, last_used=tokens[key])
+                        for key in missing
+                    ], ignore_conflicts=True)
+            except IntegrityError:
+                # A token was deleted in the meantime, no need to track it anymore
+                pass
+
+
+tracker = UsageTracker()
+atexit.register(tracker.flush)
@@ -1,7 +1,10 @@
+import time
+from contextlib import contextmanager
 from os import urandom
 from binascii import hexlify
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 
 User = get_user_model()
@@ -31,3 +34,61 @@ def auth_field_generator(user_fields, add_suffix=False):
         return auth_field_generator(login_field, add_suffix=True)
 
     return login_field
+
+
+def keyset_batches(queryset, fields, batch_size=1000, sleep=0):
+    """
+    Iterate over a queryset in primary key order with keyset pagination, so each batch is an
+    indexed range scan no matter how far into the table it is.
+
+    Args:
+        queryset (QuerySet): rows to iterate over.
+        fields (list): fields to fetch, besides the primary key.
+        batch_size (int): rows per batch.
+        sleep (float): seconds to wait between batches, to throttle the load on the database.
+
+    Yields:
+        (list) Tuples with the primary key followed by the `fields` values.
+    """
+    pk_name = queryset.model._meta.pk.name
+    last_pk = None
+    while True:
+        batch = queryset.order_by(pk_name)
+        if last_pk is not None:
+            batch = batch.filter(**{'{}__gt'.format(pk_name): last_pk})
+        batch = list(batch.values_list(pk_name, *fields)[:batch_size])
+        if not batch:
+            return
+
+        last_pk = batch[-1][0]
+        yield batch
+
+        if len(batch) < batch_size:
+            return
+        time.sleep(sleep)
+
+
+@contextmanager
+def single_flight(key, timeout=30, wait=10, interval=0.05):
+    """
+    Run the block for one caller at a time per `key`, across all processes sharing the Django
+    cache. Other callers wait until it finishes, so they can reuse what it did.
+
+    Args:
+        key (str): cache key of the lock.
+        timeout (int): seconds after which the lock is released, if its holder died.
+        wait (float): seconds to wait for the lock before running the block anyway.
+        interval (float): seconds between attempts to take the lock.
+    """
+    value = hexlify(urandom(8)).decode()
+    deadline = time.monotonic() + wait
+    acquired = cache.add(key, value, timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(interval)
+        acquired = cache.add(key, value, timeout)
+
+    try:
+        yield
+    finally:
+        if acquired and cache.get(key) == value:
+            cache.delete(key)
@@ -25,6 +25,10 @@ setup(
         'django-cors-headers >= 3.0',
         'requests >= 2.18'
     ],
+    extras_require={
+        'async': ['httpx >= 0.18'],
+        'google': ['PyJWT[crypto] >= 2.0'],
+    },
 
     classifiers=[
         'Environment :: Web Environment',
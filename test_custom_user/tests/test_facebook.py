@@ -10,7 +10,7 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 
 from cklauth import constants
-from cklauth.models import SocialAccount
+from cklauth.models import SocialIdentity
 
 User = get_user_model()
 
@@ -21,9 +21,10 @@ def create_token():
         password='secret',
         full_name='Test Tester',
     )
-    SocialAccount.objects.create(
+    SocialIdentity.objects.create(
         user=user,
-        facebook_id='114530204813906326950'
+        provider='facebook',
+        uid='114530204813906326950'
     )
     token = Token.objects.create(user=user)
 
@@ -55,7 +56,7 @@ def mock_facebook_get(mocker):
             )
         return requests.get(url, *args, **kwargs)
 
-    mocked_get = mocker.patch.object(requests, 'get', autospec=True)
+    mocked_get = mocker.patch.object(requests.Session, 'get')
     mocked_get.side_effect = get
     return mocked_get
 
@@ -74,7 +75,7 @@ def mock_facebook_post(mocker):
             )
         return requests.post(url, *args, **kwargs)
 
-    mocked_post = mocker.patch.object(requests, 'post', autospec=True)
+    mocked_post = mocker.patch.object(requests.Session, 'post')
     mocked_post.side_effect = post
     return mocked_post
 
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from cklauth import conf
+from cklauth.api.v1.serializers import compile_user_serializer
+
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ssn', ['1234567890', None])
+def test_compiled_user_serializer_matches_serializer(ssn):
+    user = User.objects.create_user(email='test@test.com', full_name='test tester', ssn=ssn)
+    UserSerializer = conf.auth_settings().user_serializer
+
+    assert (
+        json.dumps(compile_user_serializer(UserSerializer)(user)) ==
+        json.dumps(UserSerializer(instance=user).data)
+    )
@@ -0,0 +1,30 @@
+"""
+Micro-benchmarks of the cklauth request paths, run against an in-memory test database.
+
+Run them from the test project folder, e.g.:
+    python -m benchmarks.bench_refresh
+"""
+import os
+import timeit
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_default_user.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def report(name, func, number=100, repeat=5):
+    """
+    Print the best average time per call of `func` among `repeat` runs of `number` calls.
+    """
+    seconds = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print('{:<50} {:>12.1f} us'.format(name, seconds * 1e6))
+    return seconds
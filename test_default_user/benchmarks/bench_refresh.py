@@ -0,0 +1,50 @@
+"""
+Compare the cost of the refresh endpoint with a login, both returning a new token.
+"""
+import json
+
+from benchmarks import report, setup
+
+
+def main():
+    setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+
+    settings.CKL_REST_AUTH = {
+        **settings.CKL_REST_AUTH,
+        'TOKEN_TYPE': 'signed',
+        'REFRESH_TOKEN': {**settings.CKL_REST_AUTH['REFRESH_TOKEN'], 'ENABLED': True},
+    }
+
+    get_user_model().objects.create_user(username='test', email='a@a.com', password='secret')
+    client = Client()
+
+    def login():
+        response = client.post(
+            reverse('cklauth:login'),
+            data=json.dumps({'username': 'test', 'password': 'secret'}),
+            content_type='application/json'
+        )
+        return json.loads(response.content.decode('utf-8'))
+
+    refresh_token = [login()['refresh_token']]
+
+    def refresh():
+        response = client.post(
+            reverse('cklauth:refresh'),
+            data=json.dumps({'refresh_token': refresh_token[0]}),
+            content_type='application/json'
+        )
+        refresh_token[0] = json.loads(response.content.decode('utf-8'))['refresh_token']
+
+    login_time = report('POST login/', login, number=5)
+    refresh_time = report('POST refresh/', refresh)
+    print('refresh is {:.0f}x faster than login'.format(login_time / refresh_time))
+
+
+if __name__ == '__main__':
+    main()
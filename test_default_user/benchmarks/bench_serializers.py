@@ -0,0 +1,84 @@
+"""
+Compare building the register serializer of a request with a new class every time, as it used to
+be, with the memoized class and its cached fields. Then building the login serializer from all
+the model serializer fields and dropping the unwanted ones, as it used to be, with copying only the
+cached subset of fields. And validating the login payload with the login serializer or with the
+plain login validator. Finally serializing the user of a response with the user serializer or
+with the compiled one.
+"""
+from benchmarks import report, setup
+
+
+def main():
+    setup()
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.serializers import ModelSerializer
+
+    from cklauth.api.v1.serializers import (
+        LoginSerializer, LoginValidator, RegisterSerializerFactory, UserSerializer,
+        compile_user_serializer
+    )
+
+    data = {'username': 'test', 'email': 'a@a.com', 'password': 'secret'}
+
+    def uncached():
+        RegisterSerializer = RegisterSerializerFactory.__wrapped__(UserSerializer)
+        # Introspects the model, as the fields were built before they were cached
+        return ModelSerializer.get_fields(RegisterSerializer(data=data))
+
+    def cached():
+        RegisterSerializer = RegisterSerializerFactory(UserSerializer)
+        return RegisterSerializer(data=data).get_fields()
+
+    uncached_time = report('RegisterSerializer, new class per request', uncached, number=500)
+    cached_time = report('RegisterSerializer, memoized class', cached, number=500)
+    print('memoized is {:.1f}x faster'.format(uncached_time / cached_time))
+
+    login_fields = ['username', 'password']
+
+    def all_fields():
+        serializer = LoginSerializer(data=data)
+        fields = ModelSerializer.get_fields(serializer)
+        for field_name in set(fields) - set(login_fields):
+            fields.pop(field_name)
+        return fields
+
+    def subset():
+        return LoginSerializer(data=data, fields=login_fields).get_fields()
+
+    all_fields_time = report('LoginSerializer, all fields then dropped', all_fields, number=500)
+    subset_time = report('LoginSerializer, cached subset', subset, number=500)
+    print('cached subset is {:.1f}x faster'.format(all_fields_time / subset_time))
+
+    login_data = {'username': 'test', 'password': 'secret'}
+    validator = LoginValidator(login_fields)
+
+    def serializer_validation():
+        serializer = LoginSerializer(data=login_data, fields=login_fields)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def validator_validation():
+        return validator.validate(login_data)
+
+    serializer_time = report('Login payload, LoginSerializer', serializer_validation, number=500)
+    validator_time = report('Login payload, LoginValidator', validator_validation, number=500)
+    print('LoginValidator is {:.0f}x faster'.format(serializer_time / validator_time))
+
+    user = get_user_model().objects.create_user(username='test', email='a@a.com')
+    serialize_user = compile_user_serializer(UserSerializer)
+
+    def user_serializer():
+        return UserSerializer(instance=user).data
+
+    def compiled():
+        return serialize_user(user)
+
+    serializer_time = report('User response, UserSerializer', user_serializer, number=500)
+    compiled_time = report('User response, compiled', compiled, number=500)
+    print('compiled is {:.0f}x faster'.format(serializer_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import threading
+
+import django
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from cklauth import constants, providers
+from cklauth.models import SocialIdentity
+
+if django.VERSION < (3, 1):
+    pytest.skip('Async views require Django 3.1+', allow_module_level=True)
+
+httpx = pytest.importorskip('httpx')
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+
+
+User = get_user_model()
+
+FACEBOOK_USER = {
+    'email': 'user@test.com',
+    'first_name': 'test',
+    'last_name': 'tester',
+    'id': '2024821427134319'
+}
+
+
+@pytest.fixture
+def mock_facebook(mocker):
+    cache.clear()
+    calls = []
+
+    async def request(method, url, **kwargs):
+        calls.append((method, url))
+        if url == constants.FACEBOOK_TOKEN_URL:
+            return httpx.Response(200, json={'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje'})
+        if url == constants.FACEBOOK_USER_URL:
+            return httpx.Response(200, json=FACEBOOK_USER)
+        return httpx.Response(404)
+
+    mocker.patch.object(httpx.AsyncClient, 'request', side_effect=request)
+    yield calls
+    cache.clear()
+
+
+@async_to_sync
+async def post(url, payload):
+    return await AsyncClient().post(
+        url,
+        data=json.dumps(payload),
+        content_type='application/json'
+    )
+
+
+@pytest.mark.django_db
+def test_async_register_with_facebook(mock_facebook):
+    request = post(reverse('cklauth:facebook-async'), {'code': '4/bmqYo8h-LqR_ahQNrFM9w6QjiiacF'})
+
+    content = json.loads(request.content.decode('utf-8'))
+    user = User.objects.get()
+
+    assert request.status_code == status.HTTP_201_CREATED
+    assert content['token'] == Token.objects.get(user=user).key
+    assert user.social_identities.get().uid == FACEBOOK_USER['id']
+    assert mock_facebook == [
+        ('POST', constants.FACEBOOK_TOKEN_URL),
+        ('GET', constants.FACEBOOK_USER_URL),
+    ]
+
+
+@pytest.mark.django_db
+def test_async_login_with_facebook(mock_facebook):
+    user = User.objects.create_user(username='test', email='user@test.com')
+    SocialIdentity.objects.create(user=user, provider='facebook', uid=FACEBOOK_USER['id'])
+
+    request = post(
+        reverse('cklauth:facebook-async'),
+        {'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje'}
+    )
+
+    assert request.status_code == status.HTTP_200_OK
+    assert json.loads(request.content.decode('utf-8'))['user']['email'] == 'user@test.com'
+    assert mock_facebook == [('GET', constants.FACEBOOK_USER_URL)]
+
+
+@pytest.mark.django_db
+def test_async_email_conflict(mock_facebook):
+    User.objects.create_user(username='test', email='user@test.com')
+
+    request = post(reverse('cklauth:facebook-async'), {'access_token': 'token'})
+
+    assert request.status_code == status.HTTP_400_BAD_REQUEST
+    assert json.loads(request.content.decode('utf-8')) == {
+        'non_field_errors': ['Registered with email.']
+    }
+
+
+@pytest.mark.django_db
+def test_async_cache_calls_off_event_loop(mock_facebook, settings, mocker):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'USER_INFO_CACHE': {'TIMEOUT': 60},
+        'CIRCUIT_BREAKER': {**settings.CKL_REST_AUTH['CIRCUIT_BREAKER'], 'ENABLED': True},
+    })
+    on_event_loop = []
+
+    def spy(name, function):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(name)
+            except RuntimeError:
+                pass
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in ('before_call', 'record'):
+        function = getattr(providers.CircuitBreaker, name)
+        mocker.patch.object(providers.CircuitBreaker, name, spy(name, function))
+    user_info_cache = mocker.patch('cklauth.api.v1.async_views.cache')
+    user_info_cache.get.side_effect = spy('get', lambda key: None)
+    user_info_cache.set.side_effect = spy('set', lambda key, value, timeout: None)
+
+    request = post(
+        reverse('cklauth:facebook-async'),
+        {'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje'}
+    )
+
+    assert request.status_code == status.HTTP_201_CREATED
+    assert user_info_cache.get.called and user_info_cache.set.called
+    assert on_event_loop == []
+
+
+@pytest.mark.django_db
+def test_async_provider_unreachable(mocker):
+    mocker.patch.object(
+        httpx.AsyncClient,
+        'request',
+        side_effect=httpx.ConnectTimeout('timed out')
+    )
+
+    request = post(reverse('cklauth:google-async'), {'code': 'code'})
+
+    assert request.status_code == status.HTTP_502_BAD_GATEWAY
+
+
+@pytest.mark.django_db
+def test_async_without_httpx(mocker):
+    mocker.patch.object(providers, 'httpx', None)
+    mocker.patch.object(providers, 'ASYNC_HTTP_ERRORS', ())
+
+    with pytest.raises(ImproperlyConfigured, match='require httpx'):
+        post(reverse('cklauth:google-async'), {'code': 'code'})
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_register():
+    request = post(reverse('cklauth:register-async'), {
+        'username': 'username',
+        'email': 'email@email.com',
+        'password': 'password'
+    })
+
+    content = json.loads(request.content.decode('utf-8'))
+    user = User.objects.get(username='username')
+
+    assert request.status_code == status.HTTP_201_CREATED
+    assert content['token'] == Token.objects.get(user=user).key
+    assert user.check_password('password')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_register_invalid_payload():
+    request = post(reverse('cklauth:register-async'), {'username': 'username'})
+
+    assert request.status_code == status.HTTP_400_BAD_REQUEST
+    assert json.loads(request.content.decode('utf-8')) == {
+        'password': ['This field is required.']
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_login():
+    user = User.objects.create_user(username='test', email='test@test.com', password='secret')
+
+    request = post(reverse('cklauth:login-async'), {'username': 'test', 'password': 'secret'})
+
+    content = json.loads(request.content.decode('utf-8'))
+    assert request.status_code == status.HTTP_200_OK
+    assert content['token'] == Token.objects.get(user=user).key
+    assert content['user']['id'] == user.id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_logins_authenticate_concurrently(mocker):
+    # Only passes when the four logins authenticate at the same time, on different threads
+    barrier = threading.Barrier(4, timeout=5)
+
+    def authenticate(username, password):
+        barrier.wait()
+        return None
+
+    mocker.patch('cklauth.api.v1.async_views.authenticate', side_effect=authenticate)
+
+    @async_to_sync
+    async def login_concurrently():
+        return await asyncio.gather(*[
+            AsyncClient().post(
+                reverse('cklauth:login-async'),
+                data=json.dumps({'username': 'test-{}'.format(alias), 'password': 'secret'}),
+                content_type='application/json'
+            )
+            for alias in range(4)
+        ])
+
+    requests = login_concurrently()
+
+    assert [request.status_code for request in requests] == [status.HTTP_401_UNAUTHORIZED] * 4
+    assert not barrier.broken
+
+
+@pytest.mark.django_db
+def test_async_register_admission_before_validation(settings, mocker):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'HASHING': {**settings.CKL_REST_AUTH['HASHING'], 'MAX_IN_FLIGHT': 0},
+    })
+    is_valid = mocker.patch('rest_framework.serializers.BaseSerializer.is_valid')
+
+    request = post(reverse('cklauth:register-async'), {
+        'username': 'test',
+        'email': 'test@test.com',
+        'password': 'secret',
+    })
+
+    assert request.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert not is_valid.called
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('username, password', [('test', 'wrong'), ('nobody', 'secret')])
+def test_async_login_wrong_credentials(username, password):
+    User.objects.create_user(username='test', email='test@test.com', password='secret')
+
+    request = post(reverse('cklauth:login-async'), {'username': username, 'password': password})
+
+    assert request.status_code == status.HTTP_401_UNAUTHORIZED
+    assert json.loads(request.content.decode('utf-8')) == {
+        'non_field_errors': ['Wrong credentials.']
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url_name', ['cklauth:login', 'cklauth:login-async'])
+def test_login_inactive_user(url_name):
+    User.objects.create_user(
+        username='test',
+        email='test@test.com',
+        password='secret',
+        is_active=False
+    )
+
+    request = post(reverse(url_name), {'username': 'test', 'password': 'secret'})
+
+    assert request.status_code == status.HTTP_401_UNAUTHORIZED
+    assert not Token.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_password_reset(mailoutbox):
+    User.objects.create_user(username='test', email='test@test.com', password='secret')
+
+    request = post(reverse('cklauth:password-reset-async'), {'email': 'test@test.com'})
+
+    assert request.status_code == status.HTTP_200_OK
+    assert len(mailoutbox) == 1
@@ -0,0 +1,49 @@
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from cklauth import conf
+from cklauth.utils import auth_field_generator
+
+
+def test_compiles_dotted_paths(settings):
+    compiled = conf.auth_settings()
+
+    assert compiled.user_serializer.__qualname__ == 'UserSerializer'
+    assert compiled.providers['GOOGLE'].auth_field_generator is auth_field_generator
+
+
+def test_compiles_user_info_mapping(settings):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'FACEBOOK': {
+            **settings.CKL_REST_AUTH['FACEBOOK'],
+            'USER_INFO_MAPPING': {
+                'email': 'email',
+                'first_name': lambda info: info['name'].split()[0],
+            },
+        },
+    })
+
+    map_user_info = conf.auth_settings().providers['FACEBOOK'].map_user_info
+
+    assert map_user_info({'name': 'test tester'}) == {'email': None, 'first_name': 'test'}
+
+
+def test_recompiles_when_settings_change(settings):
+    compiled = conf.auth_settings()
+    assert conf.auth_settings() is compiled
+
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH})
+
+    assert conf.auth_settings() is not compiled
+
+
+@pytest.mark.parametrize('override', [
+    {'USER_SERIALIZER': 'cklauth.api.v1.serializers.MissingSerializer'},
+    {'TOKEN_TYPE': 'jwt'},
+    {'GOOGLE': {'AUTH_FIELD_GENERATOR': 'cklauth.utils.missing_generator'}},
+    {'GOOGLE': {'USER_INFO_MAPPING': {'email': 1}}},
+])
+def test_misconfiguration(settings, override):
+    with pytest.raises(ImproperlyConfigured):
+        conf.compile_settings({**settings.CKL_REST_AUTH, **override})
@@ -0,0 +1,152 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from cklauth import tokens
+from cklauth.auth import CachedTokenAuthentication, DeviceTokenAuthentication
+from cklauth.models import DeviceToken
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def device_tokens(settings):
+    cache.clear()
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH, 'TOKEN_TYPE': 'device'})
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='test', email='user@test.com', password='secret')
+
+
+def login(client, device):
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'test', 'password': 'secret', 'device': device}),
+        content_type='application/json'
+    )
+    return json.loads(request.content.decode('utf-8'))['token']
+
+
+def authenticate(key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return DeviceTokenAuthentication().authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_login_issues_token_per_device(client, device_tokens, user):
+    phone = login(client, 'phone')
+    laptop = login(client, 'laptop')
+
+    assert phone != laptop
+    assert authenticate(phone)[1].device == 'phone'
+    assert authenticate(laptop)[1].device == 'laptop'
+    assert authenticate(phone)[0] == user
+
+
+@pytest.mark.django_db()
+def test_list_device_tokens(client, device_tokens, user):
+    login(client, 'phone')
+    _, laptop = authenticate(login(client, 'laptop'))
+
+    api_client = APIClient()
+    api_client.force_authenticate(user=user, token=laptop)
+    request = api_client.get(reverse('cklauth:tokens'))
+
+    content = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_200_OK
+    assert [(token['device'], token['current']) for token in content] == [
+        ('laptop', True),
+        ('phone', False),
+    ]
+
+
+@pytest.mark.django_db()
+def test_revoke_device_token(client, device_tokens, user):
+    phone = login(client, 'phone')
+    laptop = login(client, 'laptop')
+    _, phone_token = authenticate(phone)
+
+    api_client = APIClient()
+    api_client.force_authenticate(user=user, token=phone_token)
+    request = api_client.delete(reverse('cklauth:token', args=[phone_token.pk]))
+
+    assert request.status_code == status.HTTP_200_OK
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(phone)
+    assert authenticate(laptop)[0] == user
+
+    request = api_client.delete(reverse('cklauth:token', args=[phone_token.pk]))
+    assert request.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db()
+def test_revoke_all_device_tokens(client, device_tokens, user, django_assert_num_queries):
+    keys = [login(client, 'device-{}'.format(i)) for i in range(3)]
+    other_user = User.objects.create_user(username='other', email='o@test.com', password='secret')
+    other_key = tokens.issue_token(other_user).key
+
+    # One SELECT for the database token, a SELECT and two DELETEs for the device tokens and the
+    # refresh tokens linked to them, and one UPDATE for the other refresh tokens
+    with django_assert_num_queries(5):
+        tokens.revoke_all_tokens(user.pk)
+
+    for key in keys:
+        with pytest.raises(exceptions.AuthenticationFailed):
+            authenticate(key)
+    assert authenticate(other_key)[0] == other_user
+
+
+@pytest.mark.django_db()
+def test_revoke_all_endpoint(client, device_tokens, user):
+    key = login(client, 'phone')
+
+    api_client = APIClient()
+    api_client.force_authenticate(user=user, token=authenticate(key)[1])
+    request = api_client.delete(reverse('cklauth:tokens'))
+
+    assert request.status_code == status.HTTP_200_OK
+    assert not DeviceToken.objects.exists()
+
+
+@pytest.mark.django_db()
+def test_device_token_expired(settings, device_tokens, user):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'DEVICE_TOKEN': {**settings.CKL_REST_AUTH['DEVICE_TOKEN'], 'MAX_AGE': -1},
+    })
+    key = tokens.issue_token(user, device='phone').key
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(key)
+
+
+@pytest.mark.django_db()
+def test_revoke_all_endpoint_database_token(user):
+    cache.clear()
+    token = tokens.issue_token(user)
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(token.key))
+    # Caches the token
+    assert CachedTokenAuthentication().authenticate(Request(request))[0] == user
+
+    api_client = APIClient()
+    api_client.force_authenticate(user=user, token=token)
+    response = api_client.delete(reverse('cklauth:tokens'))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not Token.objects.filter(user=user).exists()
+    with pytest.raises(exceptions.AuthenticationFailed):
+        CachedTokenAuthentication().authenticate(Request(request))
+    cache.clear()
@@ -0,0 +1,66 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth import tokens
+from cklauth.auth import DeviceTokenAuthentication
+from cklauth.models import DeviceToken
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user():
+    cache.clear()
+    yield User.objects.create_user(username='test', email='user@test.com', password='secret')
+    cache.clear()
+
+
+def authenticate(key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return DeviceTokenAuthentication().authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_device_token_key_not_stored(user):
+    key = tokens.issue_device_token(user, 'phone').key
+
+    token = DeviceToken.objects.get()
+    assert token.digest == DeviceToken.make_digest(key)
+    assert key not in token.digest
+    assert token.key_prefix == key[:DeviceToken.PREFIX_LENGTH]
+
+
+@pytest.mark.django_db()
+def test_device_token_single_query(django_assert_num_queries, user):
+    key = tokens.issue_device_token(user, 'phone').key
+
+    with django_assert_num_queries(1):
+        assert authenticate(key)[0] == user
+
+
+@pytest.mark.django_db()
+def test_migrate_tokens(user):
+    other = User.objects.create_user(username='other', email='other@test.com', password='secret')
+    keys = [Token.objects.create(user=user).key, Token.objects.create(user=other).key]
+
+    call_command('cklauth_migrate_tokens', batch_size=1, sleep=0)
+    call_command('cklauth_migrate_tokens', batch_size=1, sleep=0)
+
+    assert DeviceToken.objects.count() == 2
+    assert [authenticate(key)[0] for key in keys] == [user, other]
+
+
+@pytest.mark.django_db()
+def test_migrate_tokens_delete(user):
+    key = Token.objects.create(user=user).key
+
+    call_command('cklauth_migrate_tokens', sleep=0, delete=True)
+
+    assert not Token.objects.exists()
+    assert authenticate(key)[0] == user
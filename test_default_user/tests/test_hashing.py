@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from cklauth import hashing, metrics
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def thread_executor(settings):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'HASHING': {
+            **settings.CKL_REST_AUTH['HASHING'],
+            'EXECUTOR': 'thread',
+            'WORKERS': 1,
+            'MAX_QUEUE': 0,
+        },
+    })
+    setattr(settings, 'AUTHENTICATION_BACKENDS', ['cklauth.auth.EmailOrUsernameModelBackend'])
+    metrics.reset()
+    return hashing.get_executor()
+
+
+@pytest.mark.django_db()
+def test_login_with_hashing_executor(client, thread_executor):
+    user = User.objects.create_user(username='username', email='a@a.com', password='secret')
+
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'username', 'password': 'secret'}),
+        content_type='application/json'
+    )
+
+    content = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_200_OK
+    assert content['token'] == Token.objects.get(user=user).key
+
+    timings = metrics.snapshot()['timings']
+    assert timings['hashing.queue_wait']['count'] == 1
+    assert timings['hashing.hash_time']['count'] == 1
+
+
+@pytest.mark.django_db()
+def test_register_with_hashing_executor(client, thread_executor):
+    request = client.post(
+        path=reverse('cklauth:register'),
+        data=json.dumps({
+            'username': 'username',
+            'email': 'email@email.com',
+            'password': 'password'
+        }),
+        content_type='application/json'
+    )
+
+    assert request.status_code == status.HTTP_201_CREATED
+    assert User.objects.get(username='username').check_password('password')
+
+
+@pytest.mark.django_db()
+def test_login_hashing_queue_full(client, thread_executor):
+    User.objects.create_user(username='username', email='a@a.com', password='secret')
+
+    # Take the only slot, as a hash in progress would
+    thread_executor.slots.acquire()
+    try:
+        request = client.post(
+            path=reverse('cklauth:login'),
+            data=json.dumps({'username': 'username', 'password': 'secret'}),
+            content_type='application/json'
+        )
+    finally:
+        thread_executor.slots.release()
+
+    assert request.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert metrics.snapshot()['counters']['hashing.rejected'] == 1
+
+
+@pytest.mark.django_db()
+def test_login_shed_when_too_many_in_flight(client, settings, django_assert_num_queries):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'HASHING': {
+            **settings.CKL_REST_AUTH['HASHING'],
+            'MAX_IN_FLIGHT': 1,
+        },
+    })
+    metrics.reset()
+
+    # Another request is hashing already
+    with hashing.admission.admit():
+        with django_assert_num_queries(0):
+            request = client.post(
+                path=reverse('cklauth:login'),
+                data=json.dumps({'username': 'username', 'password': 'secret'}),
+                content_type='application/json'
+            )
+
+    content = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert int(request['Retry-After']) >= 1
+    assert content['non_field_errors'] == ['Server is busy, try again later.']
+    assert metrics.snapshot()['counters']['hashing.shed'] == 1
+    assert hashing.admission.in_flight == 0
@@ -0,0 +1,162 @@
+import json
+import time
+
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from rest_framework import status
+
+from cklauth import conf, constants, id_tokens
+
+jwt = pytest.importorskip('jwt')
+pytest.importorskip('cryptography')
+
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from jwt.algorithms import RSAAlgorithm  # noqa: E402
+
+
+User = get_user_model()
+
+CLIENT_ID = 'insert-your-key'
+
+
+@pytest.fixture(scope='module')
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def make_id_token(private_key, kid='test-key', **claims):
+    return jwt.encode(
+        {
+            'iss': 'https://accounts.google.com',
+            'aud': CLIENT_ID,
+            'sub': '114530204813906326950',
+            'email': 'user@test.com',
+            'given_name': 'test',
+            'family_name': 'tester',
+            'exp': int(time.time()) + 3600,
+            **claims,
+        },
+        private_key,
+        algorithm='RS256',
+        headers={'kid': kid}
+    )
+
+
+class MockResponse:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.content
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def mock_jwks(mocker, private_key):
+    cache.clear()
+    id_tokens._jwks.clear()
+    jwk = {**json.loads(RSAAlgorithm.to_jwk(private_key.public_key())), 'kid': 'test-key'}
+
+    def get(url, *args, **kwargs):
+        assert url == constants.GOOGLE_JWKS_URL
+        return MockResponse(
+            {'keys': [jwk]},
+            headers={'Cache-Control': 'public, max-age=19800, must-revalidate'}
+        )
+
+    yield mocker.patch.object(requests.Session, 'get', side_effect=get)
+    cache.clear()
+    id_tokens._jwks.clear()
+
+
+def verify(id_token):
+    return id_tokens.verify_id_token(id_token, CLIENT_ID, constants.GOOGLE_JWKS_URL)
+
+
+def test_verify_id_token(private_key, mock_jwks):
+    claims = verify(make_id_token(private_key))
+
+    assert claims['sub'] == '114530204813906326950'
+
+
+def test_jwks_cached(private_key, mock_jwks):
+    verify(make_id_token(private_key))
+    verify(make_id_token(private_key))
+    assert mock_jwks.call_count == 1
+
+    # Other processes get the keys from the Django cache
+    id_tokens._jwks.clear()
+    verify(make_id_token(private_key))
+    assert mock_jwks.call_count == 1
+    assert id_tokens.get_jwks(constants.GOOGLE_JWKS_URL).expires > time.time() + 19000
+
+
+@pytest.mark.parametrize('claims', [
+    {'aud': 'someone-else'},
+    {'iss': 'https://evil.example.com'},
+    {'exp': int(time.time()) - 10},
+    {'kid': 'unknown-key'},
+])
+def test_verify_id_token_invalid(private_key, mock_jwks, claims):
+    with pytest.raises(id_tokens.InvalidIDToken):
+        verify(make_id_token(private_key, **claims))
+
+
+def test_verify_id_token_other_algorithm(private_key, mock_jwks):
+    id_token = jwt.encode(
+        {'aud': CLIENT_ID, 'iss': 'accounts.google.com', 'exp': int(time.time()) + 3600},
+        'secret',
+        algorithm='HS256',
+        headers={'kid': 'test-key'}
+    )
+
+    with pytest.raises(id_tokens.InvalidIDToken, match='Unsupported algorithm.'):
+        verify(id_token)
+
+
+def test_verify_id_token_tampered(private_key, mock_jwks):
+    header, _, signature = make_id_token(private_key).split('.')
+    _, payload, _ = make_id_token(private_key, sub='someone-else').split('.')
+
+    with pytest.raises(id_tokens.InvalidIDToken):
+        verify('.'.join([header, payload, signature]))
+
+
+@pytest.mark.django_db
+def test_google_login_without_userinfo_call(client, settings, mocker, private_key, mock_jwks):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'GOOGLE': {**settings.CKL_REST_AUTH['GOOGLE'], 'VERIFY_ID_TOKEN': True},
+    })
+    mocker.patch.object(requests.Session, 'post', return_value=MockResponse({
+        'access_token': 'access-token',
+        'id_token': make_id_token(private_key),
+    }))
+
+    request = client.post(path=reverse('cklauth:google'), data={'code': 'code'})
+
+    user = User.objects.get()
+    assert request.status_code == status.HTTP_201_CREATED
+    assert user.email == 'user@test.com'
+    assert user.social_identities.get().uid == '114530204813906326950'
+    assert [call[0][0] for call in mock_jwks.call_args_list] == [constants.GOOGLE_JWKS_URL]
+
+
+def test_verify_id_token_without_pyjwt(private_key, mock_jwks, mocker, settings):
+    mocker.patch.object(id_tokens, 'jwt', None)
+
+    with pytest.raises(ImproperlyConfigured):
+        verify(make_id_token(private_key))
+    with pytest.raises(ImproperlyConfigured):
+        conf.compile_settings({
+            **settings.CKL_REST_AUTH,
+            'GOOGLE': {**settings.CKL_REST_AUTH['GOOGLE'], 'VERIFY_ID_TOKEN': True},
+        })
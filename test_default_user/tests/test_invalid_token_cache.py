@@ -0,0 +1,74 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth.auth import TokenAuthSupportQueryString
+
+
+User = get_user_model()
+
+INVALID_KEY = 'a' * 40
+
+
+@pytest.fixture
+def authentication(settings):
+    cache.clear()
+    TokenAuthSupportQueryString.invalid_cache.clear()
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'INVALID_TOKEN_CACHE': {
+            'TIMEOUT': 60,
+            'LOCAL_TIMEOUT': 5,
+            'BLOOM_FILTER_SIZE': 1024,
+        },
+    })
+    yield TokenAuthSupportQueryString()
+    cache.clear()
+    TokenAuthSupportQueryString.invalid_cache.clear()
+
+
+def authenticate(authentication, key):
+    request = APIRequestFactory().get('/', {'auth_token': key})
+    return authentication.authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_invalid_token_cached(authentication, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        with pytest.raises(exceptions.AuthenticationFailed):
+            authenticate(authentication, INVALID_KEY)
+
+    with django_assert_num_queries(0):
+        with pytest.raises(exceptions.AuthenticationFailed):
+            authenticate(authentication, INVALID_KEY)
+
+    # Shared by the other processes through the Django cache
+    TokenAuthSupportQueryString.invalid_cache.clear()
+    with django_assert_num_queries(0):
+        with pytest.raises(exceptions.AuthenticationFailed):
+            authenticate(authentication, INVALID_KEY)
+
+
+@pytest.mark.django_db()
+def test_invalid_token_forgotten_when_created(authentication):
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(authentication, INVALID_KEY)
+
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    Token.objects.create(user=user, key=INVALID_KEY)
+
+    assert authenticate(authentication, INVALID_KEY) == (user, Token.objects.get(user=user))
+
+
+@pytest.mark.django_db()
+def test_valid_token_not_checked_against_invalid_cache(authentication, mocker):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    token = Token.objects.create(user=user)
+    cache_get = mocker.spy(cache, 'get')
+
+    assert authenticate(authentication, token.key) == (user, token)
+    assert not cache_get.called
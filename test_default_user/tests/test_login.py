@@ -103,3 +103,36 @@ def test_login_wrong_password(client):
 
     assert request.status_code == status.HTTP_401_UNAUTHORIZED
     assert content['non_field_errors'] == ['Wrong credentials.']
+
+
+@pytest.mark.django_db()
+def test_login_inactive_user(client):
+    user, user_fields = create_user()
+    user.is_active = False
+    user.save()
+
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({
+            'username': user_fields['username'],
+            'password': user_fields['password'],
+        }),
+        content_type='application/json'
+    )
+
+    assert request.status_code == status.HTTP_401_UNAUTHORIZED
+    assert not Token.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db()
+def test_login_null_characters(client):
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'a\x00b', 'password': 'secret'}),
+        content_type='application/json'
+    )
+
+    assert request.status_code == status.HTTP_400_BAD_REQUEST
+    assert json.loads(request.content.decode('utf-8')) == {
+        'username': ['Null characters are not allowed.']
+    }
@@ -0,0 +1,147 @@
+import pytest
+import requests
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from cklauth import metrics, providers
+
+
+@pytest.fixture
+def client_settings(settings):
+    metrics.reset()
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'PROVIDER_HTTP': {
+            **settings.CKL_REST_AUTH['PROVIDER_HTTP'],
+            'CONNECT_TIMEOUT': 1,
+            'READ_TIMEOUT': 2,
+        },
+    })
+    yield settings
+    metrics.reset()
+
+
+def test_session_is_shared(client_settings):
+    client = providers.ProviderClient()
+
+    assert client.get_session() is client.get_session()
+
+
+def test_session_rebuilt_on_settings_change(client_settings):
+    client = providers.ProviderClient()
+    session = client.get_session()
+
+    setattr(client_settings, 'CKL_REST_AUTH', {
+        **client_settings.CKL_REST_AUTH,
+        'PROVIDER_HTTP': {**client_settings.CKL_REST_AUTH['PROVIDER_HTTP'], 'RETRIES': 5},
+    })
+
+    assert client.get_session() is not session
+    assert client.get_session().get_adapter('https://').max_retries.total == 5
+
+
+def test_request_timeouts_and_metrics(mocker, client_settings):
+    mocked_get = mocker.patch.object(requests.Session, 'get')
+    mocked_get.return_value.status_code = 200
+
+    providers.ProviderClient().get('google.user_info', 'https://example.com')
+
+    mocked_get.assert_called_once_with('https://example.com', timeout=(1, 2))
+    assert metrics.snapshot()['timings']['providers.google.user_info']['count'] == 1
+
+
+def test_post_not_retried(client_settings):
+    retry = providers.ProviderClient().get_session().get_adapter('https://').max_retries
+
+    assert retry.is_retry('GET', 503)
+    assert not retry.is_retry('POST', 503)
+
+
+@pytest.mark.django_db
+def test_provider_unreachable(client, mocker, client_settings):
+    mocker.patch.object(requests.Session, 'post', side_effect=requests.ConnectTimeout())
+
+    request = client.post(path=reverse('cklauth:google'), data={'code': 'code'})
+
+    assert request.status_code == status.HTTP_502_BAD_GATEWAY
+    assert metrics.snapshot()['counters']['providers.google.token.errors'] == 1
+
+
+@pytest.fixture
+def breaker_settings(client_settings):
+    cache.clear()
+    setattr(client_settings, 'CKL_REST_AUTH', {
+        **client_settings.CKL_REST_AUTH,
+        'CIRCUIT_BREAKER': {
+            **client_settings.CKL_REST_AUTH['CIRCUIT_BREAKER'],
+            'ENABLED': True,
+            'MIN_CALLS': 4,
+            'OPEN_TIMEOUT': 30,
+        },
+    })
+    yield client_settings
+    cache.clear()
+
+
+def test_circuit_opens_on_failures(mocker, breaker_settings):
+    mocked_get = mocker.patch.object(requests.Session, 'get', side_effect=requests.ReadTimeout())
+    client = providers.ProviderClient()
+
+    for _ in range(4):
+        with pytest.raises(requests.ReadTimeout):
+            client.get('facebook.user_info', 'https://example.com')
+
+    with pytest.raises(providers.CircuitOpen) as error:
+        client.get('facebook.user_info', 'https://example.com')
+
+    assert mocked_get.call_count == 4
+    assert error.value.retry_after == 30
+    assert client.get_breaker('facebook').state()['state'] == 'open'
+    # Other providers are not affected
+    assert client.get_breaker('google').state()['state'] == 'closed'
+
+
+def test_circuit_counts_slow_calls(mocker, breaker_settings):
+    mocker.patch.object(requests.Session, 'get').return_value.status_code = 200
+    mocker.patch('cklauth.providers.time.monotonic', side_effect=[0, 10] * 4)
+    client = providers.ProviderClient()
+
+    for _ in range(4):
+        client.get('facebook.user_info', 'https://example.com')
+
+    assert client.get_breaker('facebook').state()['state'] == 'open'
+
+
+def test_circuit_half_open_probe(mocker, breaker_settings):
+    mocked_get = mocker.patch.object(requests.Session, 'get')
+    mocked_get.return_value.status_code = 200
+    client = providers.ProviderClient()
+    breaker = client.get_breaker('facebook')
+    breaker.open(breaker_settings.CKL_REST_AUTH['CIRCUIT_BREAKER'])
+    cache.delete(breaker.key('open'))
+
+    assert breaker.state()['state'] == 'half_open'
+    assert breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(providers.CircuitOpen):
+        client.get('facebook.user_info', 'https://example.com')
+
+    breaker.record(failed=False, probe=True)
+
+    client.get('facebook.user_info', 'https://example.com')
+    assert breaker.state() == {'state': 'closed', 'calls': 1, 'failures': 0}
+
+
+@pytest.mark.django_db
+def test_circuit_open_response(client, mocker, breaker_settings):
+    breaker = providers.client.get_breaker('google')
+    breaker.open(breaker_settings.CKL_REST_AUTH['CIRCUIT_BREAKER'])
+    mocked_post = mocker.patch.object(requests.Session, 'post')
+
+    request = client.post(path=reverse('cklauth:google'), data={'code': 'code'})
+
+    assert request.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert request['Retry-After'] == '30'
+    assert not mocked_post.called
+    assert providers.circuit_states()['google']['state'] == 'open'
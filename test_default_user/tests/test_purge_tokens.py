@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth import tokens
+from cklauth.auth import TokenAuthSupportQueryString
+from cklauth.models import DeviceToken, RefreshToken, UsedRefreshToken
+
+
+User = get_user_model()
+
+
+def create_token(alias, age=0, is_active=True):
+    user = User.objects.create_user(
+        username='test-{}'.format(alias),
+        email='email-{}@test.com'.format(alias),
+        password='secret',
+        is_active=is_active
+    )
+    token = Token.objects.create(user=user)
+    Token.objects.filter(pk=token.pk).update(created=timezone.now() - timedelta(seconds=age))
+    return Token.objects.get(pk=token.pk)
+
+
+@pytest.fixture
+def token_ttl(settings):
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH, 'TOKEN_TTL': 3600})
+
+
+def authenticate(key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return TokenAuthSupportQueryString().authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_expired_token_rejected(token_ttl):
+    token = create_token('1', age=7200)
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(token.key)
+
+    assert authenticate(create_token('2', age=60).key)[0].username == 'test-2'
+
+
+@pytest.mark.django_db()
+def test_expired_token_replaced_on_login(token_ttl):
+    token = create_token('1', age=7200)
+
+    new_token = tokens.issue_token(token.user)
+
+    assert new_token.key != token.key
+    assert authenticate(new_token.key)[0] == token.user
+
+
+@pytest.mark.django_db()
+def test_purge_tokens(token_ttl):
+    valid = [create_token(alias, age=60) for alias in range(5)]
+    create_token('expired-1', age=7200)
+    create_token('expired-2', age=7200)
+    create_token('inactive', is_active=False)
+    RefreshToken.objects.create(
+        user=valid[0].user,
+        token_hash='expired',
+        expires=timezone.now()
+    )
+    tokens.issue_refresh_token(valid[0].user)
+    UsedRefreshToken.objects.create(
+        user=valid[0].user,
+        token_hash='expired',
+        expires=timezone.now()
+    )
+    used = UsedRefreshToken.objects.create(
+        user=valid[0].user,
+        token_hash='used',
+        expires=timezone.now() + timedelta(seconds=60)
+    )
+    DeviceToken.objects.create(
+        user=valid[0].user,
+        key_prefix='expired',
+        digest='expired',
+        expires=timezone.now()
+    )
+    device_token = tokens.issue_device_token(valid[0].user)
+
+    call_command('cklauth_purge_tokens', batch_size=2, sleep=0)
+
+    assert set(Token.objects.values_list('key', flat=True)) == {token.key for token in valid}
+    assert RefreshToken.objects.count() == 1
+    assert list(UsedRefreshToken.objects.all()) == [used]
+    assert list(DeviceToken.objects.all()) == [device_token]
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from cklauth import metrics
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def rate_limit(settings):
+    cache.clear()
+    metrics.reset()
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'RATE_LIMIT': {
+            'IDENTIFIER_RATE': '2/min',
+            'IP_RATE': '3/min',
+        },
+    })
+    yield
+    cache.clear()
+
+
+def login(client, username):
+    return client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': username, 'password': 'wrong'}),
+        content_type='application/json'
+    )
+
+
+@pytest.mark.django_db()
+def test_login_rate_limited_by_identifier(client, rate_limit, mocker):
+    User.objects.create_user(username='username', email='a@a.com', password='secret')
+
+    assert login(client, 'username').status_code == status.HTTP_401_UNAUTHORIZED
+    assert login(client, 'USERNAME').status_code == status.HTTP_401_UNAUTHORIZED
+
+    authenticate = mocker.patch('cklauth.api.v1.views.authenticate')
+    request = login(client, 'username')
+
+    assert request.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # Sliding window: up to a window and a half before the weighted count frees an attempt
+    assert int(request['Retry-After']) <= 90
+    assert not authenticate.called
+    assert metrics.snapshot()['counters']['ratelimit.login.rejected'] == 1
+
+
+@pytest.mark.django_db()
+def test_login_rate_limited_by_ip(client, rate_limit):
+    for alias in range(3):
+        assert login(client, 'user-{}'.format(alias)).status_code == status.HTTP_401_UNAUTHORIZED
+
+    assert login(client, 'user-3').status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+@pytest.mark.django_db()
+def test_password_reset_rate_limited(client, rate_limit, mailoutbox):
+    User.objects.create_user(username='username', email='test@mail.com', password='secret')
+
+    for _ in range(3):
+        request = client.post(
+            path=reverse('cklauth:password-reset'),
+            data=json.dumps({'email': 'test@mail.com'}),
+            content_type='application/json'
+        )
+
+    assert request.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert len(mailoutbox) == 2
+
+
+@pytest.mark.django_db()
+def test_login_rate_limit_sliding_window(client, rate_limit, mocker):
+    clock = mocker.patch('cklauth.ratelimit.time')
+
+    # Two attempts at the end of a window, the fixed window would allow two more right after
+    clock.time.return_value = 6000 - 1
+    assert login(client, 'username').status_code == status.HTTP_401_UNAUTHORIZED
+    assert login(client, 'username').status_code == status.HTTP_401_UNAUTHORIZED
+
+    clock.time.return_value = 6000 + 1
+    request = login(client, 'username')
+    assert request.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # The previous window weighs below one attempt after 30 seconds
+    assert int(request['Retry-After']) == 29
+
+    clock.time.return_value = 6000 + 30
+    assert login(client, 'username').status_code == status.HTTP_401_UNAUTHORIZED
+    assert login(client, 'username').status_code == status.HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,187 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from cklauth.models import DeviceToken, RefreshToken, UsedRefreshToken
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def refresh_tokens(settings):
+    cache.clear()
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'REFRESH_TOKEN': {
+            **settings.CKL_REST_AUTH['REFRESH_TOKEN'],
+            'ENABLED': True,
+        },
+    })
+    yield
+    cache.clear()
+
+
+def login(client):
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'test', 'password': 'secret'}),
+        content_type='application/json'
+    )
+    return json.loads(request.content.decode('utf-8'))
+
+
+def refresh(client, refresh_token):
+    return client.post(
+        path=reverse('cklauth:refresh'),
+        data=json.dumps({'refresh_token': refresh_token}),
+        content_type='application/json'
+    )
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='test', email='user@test.com', password='secret')
+
+
+@pytest.mark.django_db()
+def test_refresh_successful(client, refresh_tokens, user):
+    content = login(client)
+
+    request = refresh(client, content['refresh_token'])
+    refreshed = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_200_OK
+    assert refreshed['token'] == Token.objects.get(user=user).key
+    assert refreshed['refresh_token'] != content['refresh_token']
+    assert RefreshToken.objects.get().user == user
+
+
+@pytest.mark.django_db()
+def test_refresh_query_budget(client, refresh_tokens, user, settings,
+                              django_assert_num_queries):
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH, 'TOKEN_TYPE': 'signed'})
+    content = login(client)
+
+    # The UPDATE and the INSERT of the used hash, in a savepoint
+    with django_assert_num_queries(4):
+        request = refresh(client, content['refresh_token'])
+
+    assert request.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db()
+def test_refresh_reuse_revokes_family(client, refresh_tokens, user):
+    content = login(client)
+    refreshed = json.loads(refresh(client, content['refresh_token']).content.decode('utf-8'))
+
+    request = refresh(client, content['refresh_token'])
+
+    assert request.status_code == status.HTTP_401_UNAUTHORIZED
+    assert RefreshToken.objects.get().revoked
+    assert refresh(client, refreshed['refresh_token']).status_code == (
+        status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@pytest.mark.django_db()
+def test_refresh_reuse_of_older_token_revokes_family(client, refresh_tokens, user):
+    first = login(client)['refresh_token']
+    second = json.loads(refresh(client, first).content.decode('utf-8'))['refresh_token']
+    third = json.loads(refresh(client, second).content.decode('utf-8'))['refresh_token']
+
+    assert refresh(client, first).status_code == status.HTTP_401_UNAUTHORIZED
+    assert RefreshToken.objects.get().revoked
+    assert refresh(client, third).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrate_previous_hashes():
+    executor = MigrationExecutor(connection)
+    executor.migrate([('cklauth', '0007_refreshtoken_device_token')])
+    apps = executor.loader.project_state([('cklauth', '0007_refreshtoken_device_token')]).apps
+
+    HistoricalUser = apps.get_model(User._meta.app_label, User._meta.model_name)
+    HistoricalRefreshToken = apps.get_model('cklauth', 'RefreshToken')
+    user = HistoricalUser.objects.create(username='test', email='user@test.com')
+    expires = timezone.now()
+    HistoricalRefreshToken.objects.create(
+        user_id=user.pk,
+        token_hash='current',
+        previous_hash='previous',
+        expires=expires
+    )
+    HistoricalRefreshToken.objects.create(user_id=user.pk, token_hash='new', expires=expires)
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+    assert list(UsedRefreshToken.objects.values_list('user_id', 'token_hash', 'expires')) == [
+        (user.pk, 'previous', expires),
+    ]
+
+
+@pytest.mark.django_db()
+def test_refresh_expired(client, refresh_tokens, user, settings):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'REFRESH_TOKEN': {
+            **settings.CKL_REST_AUTH['REFRESH_TOKEN'],
+            'MAX_AGE': -1,
+        },
+    })
+    content = login(client)
+
+    assert refresh(client, content['refresh_token']).status_code == (
+        status.HTTP_401_UNAUTHORIZED
+    )
+
+
+@pytest.mark.django_db()
+def test_refresh_invalid_token(client, refresh_tokens, user):
+    for refresh_token in ('invalid', '{}.invalid'.format(user.pk), 'x.y'):
+        request = refresh(client, refresh_token)
+        content = json.loads(request.content.decode('utf-8'))
+
+        assert request.status_code == status.HTTP_401_UNAUTHORIZED
+        assert content['non_field_errors'] == ['Invalid refresh token.']
+
+
+@pytest.mark.django_db()
+def test_refresh_replaces_device_token(client, refresh_tokens, user, settings):
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH, 'TOKEN_TYPE': 'device'})
+    content = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'test', 'password': 'secret', 'device': 'phone'}),
+        content_type='application/json'
+    ).json()
+
+    refresh_token = content['refresh_token']
+    for _ in range(3):
+        request = refresh(client, refresh_token)
+        assert request.status_code == status.HTTP_200_OK
+        refresh_token = request.json()['refresh_token']
+
+    device_token = DeviceToken.objects.get()
+    assert device_token.device == 'phone'
+    assert device_token.key_prefix == request.json()['token'][:DeviceToken.PREFIX_LENGTH]
+    assert RefreshToken.objects.get().device_token == device_token
+
+
+@pytest.mark.django_db()
+def test_revoking_device_token_revokes_refresh_token(client, refresh_tokens, user, settings):
+    setattr(settings, 'CKL_REST_AUTH', {**settings.CKL_REST_AUTH, 'TOKEN_TYPE': 'device'})
+    content = login(client)
+
+    DeviceToken.objects.all().delete()
+
+    assert refresh(client, content['refresh_token']).status_code == status.HTTP_401_UNAUTHORIZED
+    assert not DeviceToken.objects.exists()
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.http import QueryDict
+from django.urls import reverse
+from rest_framework import serializers as drf_serializers
+from rest_framework.exceptions import ValidationError
+
+from cklauth import conf
+from cklauth.api.v1 import serializers
+
+
+User = get_user_model()
+
+
+def test_register_serializer_class_is_built_once():
+    assert (
+        serializers.RegisterSerializerFactory(serializers.UserSerializer) is
+        serializers.RegisterSerializerFactory(serializers.UserSerializer)
+    )
+
+
+def test_instances_get_their_own_fields():
+    RegisterSerializer = serializers.RegisterSerializerFactory(serializers.UserSerializer)
+    first = RegisterSerializer(data={})
+    second = RegisterSerializer(data={})
+
+    assert list(first.fields) == list(second.fields)
+    assert first.fields['username'] is not second.fields['username']
+    assert first.fields['username'].parent is first
+    for first_validator, second_validator in zip(
+        first.fields['username'].validators,
+        second.fields['username'].validators
+    ):
+        assert first_validator is not second_validator
+
+
+def test_field_subsets():
+    login = serializers.LoginSerializer(fields=['email', 'password'])
+    other = serializers.LoginSerializer(fields=('password', 'email'))
+
+    assert list(login.fields) == ['email', 'password']
+    assert list(serializers.LoginSerializer(fields=['username']).fields) == ['username']
+    assert list(serializers.LoginSerializer().fields) == ['username', 'email', 'password']
+    assert login.fields['email'] is not other.fields['email']
+    assert login.get_field_templates() is other.get_field_templates()
+
+
+def validate(validator, data):
+    try:
+        return validator.validate(data), None
+    except ValidationError as error:
+        return None, error.detail
+
+
+@pytest.mark.parametrize('data', [
+    {'username': 'test', 'password': 'secret'},
+    {'username': '  test ', 'password': 12},
+    {'username': 'test'},
+    {},
+    {'username': None, 'password': ''},
+    {'username': '   ', 'password': True},
+    {'username': ['test'], 'password': {'a': 1}},
+    {'username': 'a\x00b', 'password': 'secret'},
+    QueryDict('username=test&password=secret'),
+    QueryDict('username=&password=secret'),
+    ['test', 'secret'],
+])
+def test_login_validator_matches_serializer(data):
+    fields = ['username', 'password']
+    serializer = serializers.LoginSerializer(data=data, fields=fields)
+    serializer_valid = serializer.is_valid()
+
+    validated_data, errors = validate(serializers.LoginValidator(fields), data)
+
+    if serializer_valid:
+        assert validated_data == serializer.validated_data
+    else:
+        assert errors == serializer.errors
+        for field_name, field_errors in serializer.errors.items():
+            assert [error.code for error in errors[field_name]] == [
+                error.code for error in field_errors
+            ]
+
+
+@pytest.mark.django_db
+def test_compiled_user_serializer_matches_serializer():
+    user = User.objects.create_user(username='test', email='test@test.com', password='secret')
+    UserSerializer = conf.auth_settings().user_serializer
+
+    assert (
+        json.dumps(serializers.compile_user_serializer(UserSerializer)(user)) ==
+        json.dumps(UserSerializer(instance=user).data)
+    )
+
+
+@pytest.mark.django_db
+def test_compiled_user_serializer_in_responses(client, settings):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'COMPILED_USER_SERIALIZER': True,
+    })
+    user = User.objects.create_user(username='test', email='test@test.com', password='secret')
+
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'test', 'password': 'secret'}),
+        content_type='application/json'
+    )
+
+    content = json.loads(request.content.decode('utf-8'))
+    assert content['user']['id'] == user.id
+    assert content['user'] == conf.auth_settings().user_serializer(instance=user).data
+
+
+def test_uncompilable_user_serializer():
+    class MethodFieldSerializer(serializers.UserSerializer):
+        display_name = drf_serializers.SerializerMethodField()
+
+        class Meta(serializers.UserSerializer.Meta):
+            fields = serializers.UserSerializer.Meta.fields + ('display_name',)
+
+        def get_display_name(self, user):
+            return user.get_full_name()
+
+    with pytest.raises(ImproperlyConfigured):
+        serializers.compile_user_serializer(MethodFieldSerializer)
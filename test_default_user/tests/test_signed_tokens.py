@@ -0,0 +1,137 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth import tokens
+from cklauth.auth import SignedTokenAuthentication
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def signed_tokens(settings):
+    cache.clear()
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'TOKEN_TYPE': 'signed',
+    })
+    yield
+    cache.clear()
+
+
+def authenticate(key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return SignedTokenAuthentication().authenticate(Request(request))
+
+
+def set_signed_token_settings(settings, **options):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'SIGNED_TOKEN': {
+            **settings.CKL_REST_AUTH['SIGNED_TOKEN'],
+            **options,
+        },
+    })
+
+
+@pytest.mark.django_db()
+def test_login_returns_signed_token(client, signed_tokens, django_assert_num_queries):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+
+    request = client.post(
+        path=reverse('cklauth:login'),
+        data=json.dumps({'username': 'test', 'password': 'secret'}),
+        content_type='application/json'
+    )
+
+    content = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_200_OK
+    assert not Token.objects.exists()
+
+    with django_assert_num_queries(0):
+        authenticated_user, token = authenticate(content['token'])
+
+    assert authenticated_user.pk == user.pk
+    assert token.key == content['token']
+
+
+@pytest.mark.django_db()
+def test_register_returns_signed_token(client, signed_tokens):
+    request = client.post(
+        path=reverse('cklauth:register'),
+        data=json.dumps({
+            'username': 'username',
+            'email': 'email@email.com',
+            'password': 'password'
+        }),
+        content_type='application/json'
+    )
+
+    content = json.loads(request.content.decode('utf-8'))
+
+    assert request.status_code == status.HTTP_201_CREATED
+    assert authenticate(content['token'])[0].username == 'username'
+
+
+@pytest.mark.django_db()
+def test_database_token_left_to_next_class(signed_tokens):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+
+    assert authenticate(Token.objects.create(user=user).key) is None
+
+
+@pytest.mark.django_db()
+def test_signed_token_expired(settings, signed_tokens):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    key = tokens.issue_token(user).key
+    set_signed_token_settings(settings, MAX_AGE=-1)
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(key)
+
+
+@pytest.mark.django_db()
+def test_signed_token_key_rotation(settings, signed_tokens):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    set_signed_token_settings(settings, KEYS=['old-key'])
+    key = tokens.issue_token(user).key
+
+    set_signed_token_settings(settings, KEYS=['new-key', 'old-key'])
+    assert authenticate(key)[0].pk == user.pk
+
+    set_signed_token_settings(settings, KEYS=['new-key'])
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(key)
+
+
+@pytest.mark.django_db()
+def test_signed_token_revoked(signed_tokens):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    key = tokens.issue_token(user).key
+
+    tokens.revoke_signed_tokens(user.pk)
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(key)
+    assert authenticate(tokens.issue_token(user).key)[0].pk == user.pk
+
+
+@pytest.mark.django_db()
+def test_signed_token_revoked_when_user_deactivated(signed_tokens):
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    key = tokens.issue_token(user).key
+
+    user.is_active = False
+    user.save()
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(key)
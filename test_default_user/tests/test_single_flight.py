@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from cklauth.models import SocialIdentity
+from cklauth.utils import single_flight
+
+
+User = get_user_model()
+
+LOCK_KEY = 'cklauth:social-login:FACEBOOK:2024821427134319'
+
+
+class MockResponse:
+    def __init__(self, content, status_code):
+        self.content = content
+        self.status_code = status_code
+
+    def json(self):
+        return self.content
+
+
+@pytest.fixture
+def mock_facebook_get(mocker):
+    cache.clear()
+    yield mocker.patch.object(requests.Session, 'get', return_value=MockResponse(
+        {
+            'email': 'user@test.com',
+            'first_name': 'test',
+            'last_name': 'tester',
+            'id': '2024821427134319'
+        },
+        200
+    ))
+    cache.clear()
+
+
+def login(client):
+    return client.post(
+        path=reverse('cklauth:facebook'),
+        data=json.dumps({'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje'}),
+        content_type='application/json'
+    )
+
+
+def test_single_flight_serializes():
+    cache.clear()
+    running = []
+    overlaps = []
+
+    def worker():
+        with single_flight('test-lock', interval=0.001):
+            running.append(1)
+            overlaps.append(len(running))
+            time.sleep(0.01)
+            running.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [1, 1, 1, 1]
+    assert cache.get('test-lock') is None
+
+
+@pytest.mark.django_db
+def test_concurrent_login_reuses_leader_user(client, mocker, mock_facebook_get):
+    # Another request is registering the same identity
+    cache.add(LOCK_KEY, 'leader')
+
+    def leader_finishes(seconds):
+        user = User.objects.create_user(username='test', email='user@test.com')
+        SocialIdentity.objects.create(user=user, provider='facebook', uid='2024821427134319')
+        cache.delete(LOCK_KEY)
+
+    mocker.patch('cklauth.utils.time.sleep', side_effect=leader_finishes)
+
+    request = login(client)
+
+    assert request.status_code == status.HTTP_200_OK
+    assert User.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_new_login_releases_lock(client, mock_facebook_get):
+    assert login(client).status_code == status.HTTP_201_CREATED
+    assert cache.get(LOCK_KEY) is None
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from cklauth.api.v1.views import FacebookAuthView, GoogleAuthView
+from cklauth.models import SocialIdentity
+
+
+User = get_user_model()
+
+USER_INFO = {'id': '2024821427134319', 'email': 'user@test.com'}
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='test', email='user@test.com')
+
+
+@pytest.mark.django_db
+def test_lookup_by_provider_uid(django_assert_num_queries, user):
+    SocialIdentity.objects.create(user=user, provider='facebook', uid=USER_INFO['id'])
+
+    with django_assert_num_queries(1):
+        assert FacebookAuthView().get_social_user(USER_INFO) == user
+
+
+@pytest.mark.django_db
+def test_link_another_provider(user):
+    SocialIdentity.objects.create(user=user, provider='facebook', uid=USER_INFO['id'])
+
+    assert GoogleAuthView().get_social_user({'id': '1145', 'email': 'user@test.com'}) == user
+    assert set(user.social_identities.values_list('provider', 'uid')) == {
+        ('facebook', USER_INFO['id']),
+        ('google', '1145'),
+    }
+
+
+@pytest.mark.django_db
+def test_unknown_identity(user):
+    user.email = 'other@test.com'
+    user.save()
+
+    assert FacebookAuthView().get_social_user(USER_INFO) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrate_social_accounts():
+    executor = MigrationExecutor(connection)
+    executor.migrate([('cklauth', '0005_devicetoken_digest')])
+    apps = executor.loader.project_state([('cklauth', '0005_devicetoken_digest')]).apps
+
+    HistoricalUser = apps.get_model(User._meta.app_label, User._meta.model_name)
+    SocialAccount = apps.get_model('cklauth', 'SocialAccount')
+    both = HistoricalUser.objects.create(username='both', email='both@test.com')
+    google = HistoricalUser.objects.create(username='google', email='google@test.com')
+    SocialAccount.objects.create(user_id=both.pk, google_id='1', facebook_id='2')
+    SocialAccount.objects.create(user_id=google.pk, google_id='3')
+    duplicate = HistoricalUser.objects.create(username='duplicate', email='duplicate@test.com')
+    SocialAccount.objects.create(user_id=duplicate.pk, google_id='3', facebook_id='4')
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+    assert set(SocialIdentity.objects.values_list('user_id', 'provider', 'uid')) == {
+        (both.pk, 'google', '1'),
+        (both.pk, 'facebook', '2'),
+        (google.pk, 'google', '3'),
+        (duplicate.pk, 'facebook', '4'),
+    }
+
+
+class MockResponse:
+    status_code = 200
+
+    def json(self):
+        return dict(USER_INFO, first_name='test', last_name='tester')
+
+
+@pytest.fixture
+def mock_facebook_get(mocker):
+    cache.clear()
+    yield mocker.patch.object(requests.Session, 'get', return_value=MockResponse())
+    cache.clear()
+
+
+def login(client):
+    return client.post(
+        path=reverse('cklauth:facebook'),
+        data=json.dumps({'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje'}),
+        content_type='application/json'
+    )
+
+
+@pytest.mark.django_db
+def test_query_budget_existing_identity(client, django_assert_num_queries, mock_facebook_get,
+                                        user):
+    SocialIdentity.objects.create(user=user, provider='facebook', uid=USER_INFO['id'])
+    Token.objects.create(user=user)
+
+    with django_assert_num_queries(1):
+        assert login(client).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_query_budget_new_provider(client, django_assert_num_queries, mock_facebook_get, user):
+    SocialIdentity.objects.create(user=user, provider='google', uid='1145')
+    Token.objects.create(user=user)
+
+    with django_assert_num_queries(3):
+        assert login(client).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_query_budget_email_conflict(client, django_assert_num_queries, mock_facebook_get, user):
+    with django_assert_num_queries(2):
+        assert login(client).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_query_budget_new_user(client, django_assert_num_queries, mock_facebook_get):
+    # 7 plus the 4 of the auth field generator and the default user serializer validation
+    with django_assert_num_queries(11):
+        assert login(client).status_code == status.HTTP_201_CREATED
@@ -0,0 +1,90 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth.auth import CachedTokenAuthentication
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def authentication():
+    cache.clear()
+    CachedTokenAuthentication.local_cache.clear()
+    yield CachedTokenAuthentication()
+    cache.clear()
+    CachedTokenAuthentication.local_cache.clear()
+
+
+@pytest.fixture
+def token():
+    user = User.objects.create_user(username='test', email='user@test.com', password='secret')
+    return Token.objects.create(user=user)
+
+
+def authenticate(authentication, key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return authentication.authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_cached_token_authentication(authentication, token, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        user, _ = authenticate(authentication, token.key)
+    assert user == token.user
+
+    with django_assert_num_queries(0):
+        user, cached_token = authenticate(authentication, token.key)
+    assert user.pk == token.user.pk
+    assert user.username == 'test'
+    assert cached_token.key == token.key
+
+    # Not cached fields are still available
+    with django_assert_num_queries(1):
+        assert user.email == 'user@test.com'
+
+
+@pytest.mark.django_db()
+def test_cached_token_shared_cache(authentication, token, django_assert_num_queries):
+    authenticate(authentication, token.key)
+    CachedTokenAuthentication.local_cache.clear()
+
+    with django_assert_num_queries(0):
+        user, _ = authenticate(authentication, token.key)
+    assert user.pk == token.user.pk
+
+
+@pytest.mark.django_db()
+def test_cached_token_invalidated_on_delete(authentication, token):
+    authenticate(authentication, token.key)
+    token.delete()
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(authentication, token.key)
+
+
+@pytest.mark.django_db()
+def test_cached_token_invalidated_on_user_change(authentication, token):
+    authenticate(authentication, token.key)
+    token.user.is_active = False
+    token.user.save()
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authenticate(authentication, token.key)
+
+
+@pytest.mark.django_db()
+def test_cached_token_user_save_keeps_password(authentication, token):
+    user, _ = authenticate(authentication, token.key)
+    user, _ = authenticate(authentication, token.key)
+    user.username = 'changed'
+    user.save()
+
+    user = User.objects.get(pk=user.pk)
+    assert user.username == 'changed'
+    assert user.check_password('secret')
@@ -0,0 +1,87 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cklauth import usage
+from cklauth.auth import TokenAuthSupportQueryString
+from cklauth.models import TokenActivity
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def usage_tracking(settings):
+    def enable(flush_interval):
+        setattr(settings, 'CKL_REST_AUTH', {
+            **settings.CKL_REST_AUTH,
+            'USAGE_TRACKING': {
+                'ENABLED': True,
+                'FLUSH_INTERVAL': flush_interval,
+            },
+        })
+
+    usage.tracker.flush()
+    yield enable
+    usage.tracker.flush()
+
+
+def create_token(alias):
+    user = User.objects.create_user(
+        username='test-{}'.format(alias),
+        email='email-{}@test.com'.format(alias),
+        password='secret'
+    )
+    return Token.objects.create(user=user)
+
+
+def authenticate(key):
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token {}'.format(key))
+    return TokenAuthSupportQueryString().authenticate(Request(request))
+
+
+@pytest.mark.django_db()
+def test_usage_coalesced_until_flush(usage_tracking, django_assert_num_queries):
+    usage_tracking(flush_interval=3600)
+    tokens = [create_token(alias) for alias in range(3)]
+
+    with django_assert_num_queries(6):
+        for token in tokens:
+            authenticate(token.key)
+            authenticate(token.key)
+
+    assert not TokenActivity.objects.exists()
+
+    usage.tracker.flush()
+
+    for token in tokens:
+        user = User.objects.get(pk=token.user_id)
+        assert TokenActivity.objects.get(token=token).last_used == user.last_login
+
+
+@pytest.mark.django_db()
+def test_usage_flushed_after_interval(usage_tracking):
+    usage_tracking(flush_interval=0)
+    token = create_token('1')
+
+    authenticate(token.key)
+    last_used = TokenActivity.objects.get(token=token).last_used
+
+    authenticate(token.key)
+
+    assert TokenActivity.objects.get(token=token).last_used > last_used
+    assert User.objects.get(pk=token.user_id).last_login is not None
+
+
+@pytest.mark.django_db()
+def test_usage_of_deleted_token_ignored(usage_tracking):
+    usage_tracking(flush_interval=3600)
+    token = create_token('1')
+
+    authenticate(token.key)
+    token.delete()
+    usage.tracker.flush()
+
+    assert not TokenActivity.objects.exists()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+import requests
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from cklauth import constants
+
+
+class MockResponse:
+    def __init__(self, content, status_code):
+        self.content = content
+        self.status_code = status_code
+
+    def json(self):
+        return self.content
+
+
+@pytest.fixture
+def mock_facebook_get(mocker):
+    cache.clear()
+    mocked_get = mocker.patch.object(requests.Session, 'get', return_value=MockResponse(
+        {
+            'email': 'user@test.com',
+            'first_name': 'test',
+            'last_name': 'tester',
+            'id': '2024821427134319'
+        },
+        200
+    ))
+    yield mocked_get
+    cache.clear()
+
+
+@pytest.fixture
+def user_info_cache(settings):
+    setattr(settings, 'CKL_REST_AUTH', {
+        **settings.CKL_REST_AUTH,
+        'USER_INFO_CACHE': {'TIMEOUT': 60},
+    })
+
+
+def login(client, **payload):
+    return client.post(
+        path=reverse('cklauth:facebook'),
+        data=json.dumps({'access_token': 'bh1n65vu87q59lkcz3asu2omfs1nje', **payload}),
+        content_type='application/json'
+    )
+
+
+@pytest.mark.django_db
+def test_user_info_cached(client, mock_facebook_get, user_info_cache):
+    assert login(client).status_code == status.HTTP_201_CREATED
+    assert login(client).status_code == status.HTTP_200_OK
+
+    mock_facebook_get.assert_called_once()
+    assert mock_facebook_get.call_args[0][0] == constants.FACEBOOK_USER_URL
+
+
+@pytest.mark.django_db
+def test_user_info_cache_bounded_by_expiry(client, mock_facebook_get, user_info_cache):
+    login(client, expires_in=0)
+    login(client, expires_in=0)
+
+    assert mock_facebook_get.call_count == 2
+
+
+@pytest.mark.django_db
+def test_user_info_cache_disabled(client, mock_facebook_get):
+    login(client)
+    login(client)
+
+    assert mock_facebook_get.call_count == 2